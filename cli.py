@@ -0,0 +1,280 @@
+# Single entry point of the application. Heavy modules (pandas, sklearn,
+# graphdatascience, torch) are imported inside each subcommand, so --help
+# and lightweight commands start fast.
+import sys
+import json
+import argparse
+
+def cmd_ingest(args):
+    from src import data_splitter
+    from src.id_handler import IdDictionary
+    data_splitter.main()
+    # Dense int32 indices of the user and movie ids, saved next to the csv files
+    IdDictionary.build(data_splitter.directory)
+
+def cmd_load(args):
+    from src import graph_builder
+    graph_builder.main(password=args.password)
+
+def cmd_tune(args):
+    if args.folds:
+        import cross_validation
+        return cross_validation.main(k=args.folds, nested_dimensions=args.nested_dimensions,
+                                    heap_budget_mb=args.heap_budget_mb)
+    import main
+    return main.main(subgraph_mode=args.subgraph_mode,
+                     memory_budget_mb=args.memory_budget_mb, workers=args.workers,
+                     cache_size=args.cache_size, prefetch=args.prefetch,
+                     heap_budget_mb=args.heap_budget_mb)
+
+def cmd_evaluate(args):
+    import fastrp_metrics
+    fastrp_metrics.main(workers=args.workers)
+
+def cmd_serve(args):
+    """
+    Retrieves users for cold movies already present in the graph with
+    their attribute relationships. Movie IDs come from the arguments or
+    from stdin (one per line); one JSON line is printed per movie.
+    With --backend neo4j the users are read from a vector index; with
+    --segment only the users of the segment are scored (in memory).
+    """
+    from src.node_handler import NodeSubgraphHandler
+    from src.embedding_handler import UserEmbeddingHandler, ItemEmbeddingHandler
+    from src.vector_search_handler import VectorRetriever, Neo4jVectorRetriever
+    from src.id_handler import get_id_dictionary
+    with open(args.params, "r", encoding="utf-8") as f:
+        all_params = json.load(f)
+    fasrp_params = {k: v for k, v in all_params.items() if k != "method"}
+    len_hops = len(all_params['iterationWeights'])
+    user_handler = UserEmbeddingHandler(fasrp_params)
+    if args.backend == "neo4j":
+        index_retriever = Neo4jVectorRetriever(method=all_params['method'], length=args.length)
+        user_handler.write_user_embeddings(user_handler.full_graph_projection())
+        index_retriever.create_index(fasrp_params['embeddingDimension'])
+    else:
+        user_vectors_array = user_handler.create_user_vectors_array()
+    segment_index = None
+    if args.segment:
+        if args.backend == "neo4j":
+            raise ValueError("--segment is only supported with the memory backend")
+        from src.segment_handler import UserSegmentIndex
+        segment_index = UserSegmentIndex(user_vectors_array[0])
+        segment_index.parse(args.segment)  # fails on unknown attributes/values before any projection
+    movie_ids = args.movie_ids or (line.strip() for line in sys.stdin if line.strip())
+    for movie_id in movie_ids:
+        projection = NodeSubgraphHandler(movie_id, len_hops).create_node_subgraph_projection()
+        node_array = ItemEmbeddingHandler(
+            projection, movie_id, fasrp_params).create_item_vector_array()
+        if args.backend == "neo4j":
+            rec_users = index_retriever.retrieve_users(node_array)[0]
+        else:
+            rec_users = VectorRetriever(node_array, user_vectors_array,
+                                        method=all_params['method'],
+                                        length=args.length, user_filter=args.segment,
+                                        segment_index=segment_index).retrieve_users()
+        users = get_id_dictionary().decode_users(rec_users["recommended_users"])
+        print(json.dumps({"movieId": movie_id, "users": users.tolist()}), flush=True)
+
+def cmd_incremental(args):
+    """
+    Applies streamed WATCHED edges (csv with userId,movieId columns, from
+    --events or stdin) to the user embeddings of --params in batches,
+    recomputing only the affected users, and saves the final user
+    vectors to --output. One JSON line is printed per batch.
+    """
+    import os
+    import numpy as np
+    import pandas as pd
+    from src.embedding_handler import UserEmbeddingHandler, IncrementalUserEmbeddingHandler
+    with open(args.params, "r", encoding="utf-8") as f:
+        all_params = json.load(f)
+    fasrp_params = {k: v for k, v in all_params.items() if k != "method"}
+    handler = IncrementalUserEmbeddingHandler(
+        fasrp_params, UserEmbeddingHandler(fasrp_params).create_user_vectors_array(),
+        max_closure_ratio=args.max_closure_ratio, rebuild_every=args.rebuild_every,
+        max_drift=args.max_drift, drift_sample=args.drift_sample)
+    events = pd.read_csv(args.events or sys.stdin, dtype=str, chunksize=args.batch_size)
+    for batch in events:
+        handler.apply_watch_events(zip(batch["userId"], batch["movieId"]), write=not args.no_write)
+        print(json.dumps({"edges": len(batch), "rebuilds": handler.rebuilds,
+                          "drift": handler.last_drift}), flush=True)
+    user_array, vectors = handler.user_vectors_array
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    np.savez(args.output, user_indices=user_array, embeddings=vectors)
+
+def cmd_bench(args):
+    """
+    Latency of the in-process brute-force retrieval on synthetic vectors.
+    With --backend neo4j, the User embeddings of --params are written to
+    the graph and the in-process path is compared with the vector index
+    (one query per item and batched queries) on the same random items.
+    """
+    import time
+    import numpy as np
+    from src.vector_search_handler import VectorRetriever
+    rng = np.random.default_rng(42)
+    if args.backend == "neo4j":
+        from src.embedding_handler import UserEmbeddingHandler
+        from src.vector_search_handler import Neo4jVectorRetriever
+        with open(args.params, "r", encoding="utf-8") as f:
+            all_params = json.load(f)
+        fasrp_params = {k: v for k, v in all_params.items() if k != "method"}
+        user_handler = UserEmbeddingHandler(fasrp_params)
+        projection = user_handler.full_graph_projection()
+        embeddings = user_handler.create_user_fastrp_embeddings(projection)
+        users_array = user_handler.create_user_vectors(
+            embeddings, user_handler.get_user_node_ids(embeddings))
+        user_handler.write_user_embeddings(projection)
+        dim = users_array[1].shape[1]
+    else:
+        users_array = [np.arange(args.users), rng.normal(size=(args.users, args.dim))]
+        dim = args.dim
+    items = rng.normal(size=(args.items, dim))
+    for method in ("cosine", "euclidean"):
+        start = time.perf_counter()
+        for i in range(args.items):
+            VectorRetriever([np.array(i), items[i]], users_array,
+                            method=method, length=args.length).retrieve_users()
+        elapsed = (time.perf_counter() - start) / args.items
+        print(f"{method}: {elapsed * 1000:.3f} ms/item "
+              f"({len(users_array[0])} users, dim {dim})")
+        if args.backend != "neo4j":
+            continue
+        retriever = Neo4jVectorRetriever(method=method, length=args.length)
+        retriever.create_index(dim)
+        start = time.perf_counter()
+        for i in range(args.items):
+            retriever.retrieve_users([np.array(i), items[i]])
+        elapsed = (time.perf_counter() - start) / args.items
+        print(f"{method} (neo4j index): {elapsed * 1000:.3f} ms/item")
+        start = time.perf_counter()
+        retriever.retrieve_users([np.arange(args.items), items])
+        elapsed = (time.perf_counter() - start) / args.items
+        print(f"{method} (neo4j index, batches of {retriever.batch_size}): "
+              f"{elapsed * 1000:.3f} ms/item")
+
+def cmd_stats(args):
+    """
+    Bootstrap intervals and paired tests over per-item metric files,
+    given as METHOD=PATH (json lists or Parquet tables).
+    """
+    from src.stats_handler import PairedStatisticsHandler
+    sources = dict(spec.split("=", 1) for spec in args.sources)
+    summary = PairedStatisticsHandler(sources, n_resamples=args.resamples,
+                                      confidence=args.confidence).run(args.output)
+    for test in summary["paired_tests"]:
+        print(f"{test['metric']}@{test['k']} {test['method_a']} vs {test['method_b']}: "
+              f"diff={test['mean_diff']:.4f} "
+              f"permutation p={test['permutation_pvalue']:.4f} "
+              f"wilcoxon p={test['wilcoxon_pvalue']:.4f}")
+
+def cmd_features(args):
+    """
+    Builds (or reads from the cache) the sparse user/item features of
+    the GraphSAGE training graph with the encoders of --cache-dir
+    (fitted there only if missing or with --force).
+    """
+    from src.feature_handler import SparseFeatureHandler
+    user_ids, item_ids = SparseFeatureHandler.training_ids(test_ids_path=args.test_ids)
+    features = SparseFeatureHandler(cache_dir=args.cache_dir)
+    for name, matrix in zip(("users", "items", "nodes"),
+                            features.build(user_ids, item_ids, force=args.force)):
+        print(f"{name}: {matrix.shape[0]} x {matrix.shape[1]}, {matrix.nnz} non-zeros, "
+              f"{(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1024:.0f} KB")
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Cold-start as knowledge graph completion (FastRP).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("ingest", help="download MovieLens and build the csv files")
+    p.set_defaults(func=cmd_ingest)
+
+    p = subparsers.add_parser("load", help="load the csv files into Neo4j")
+    p.add_argument("--password", help="Neo4j password (prompted if omitted)")
+    p.set_defaults(func=cmd_load)
+
+    p = subparsers.add_parser("tune", help="hyperparameter search (config_params.json)")
+    p.add_argument("--folds", type=int, default=0,
+                   help="run k-fold cross-validation with this many folds")
+    p.add_argument("--nested-dimensions", action="store_true",
+                   help="with --folds, one FastRP run per dimension group, smaller dimensions sliced")
+    p.add_argument("--subgraph-mode", choices=("cypher", "filtered"), default="cypher",
+                   help="per-item Cypher projections or GDS filtered subgraphs")
+    p.add_argument("--memory-budget-mb", type=int, default=None,
+                   help="stream user embeddings in chunks within this client memory budget")
+    p.add_argument("--workers", type=int, default=None,
+                   help="score held-out items on this many processes")
+    p.add_argument("--cache-size", type=int, default=None,
+                   help="reuse cold item vectors of movies with the same genres and release")
+    p.add_argument("--prefetch", type=int, default=0,
+                   help="prepare up to N next items in Neo4j while the current one is scored")
+    p.add_argument("--heap-budget-mb", type=int, default=None,
+                   help="refuse GDS projections that take the catalog above this memory")
+    p.set_defaults(func=cmd_tune)
+
+    p = subparsers.add_parser("evaluate", help="evaluate the best FastRP params on the test set")
+    p.add_argument("--workers", type=int, default=None,
+                   help="score test items on this many processes")
+    p.set_defaults(func=cmd_evaluate)
+
+    p = subparsers.add_parser("serve", help="retrieve users for cold movies")
+    p.add_argument("movie_ids", nargs="*", help="movie IDs (read from stdin if omitted)")
+    p.add_argument("--params", default="best_fastrp_params.json")
+    p.add_argument("--length", type=int, default=50)
+    p.add_argument("--backend", choices=("memory", "neo4j"), default="memory",
+                   help="in-process brute force or Neo4j vector index")
+    p.add_argument("--segment", default=None,
+                   help='user filter, e.g. "gender=F & age=18|25 & !occupation=student"')
+    p.set_defaults(func=cmd_serve)
+
+    p = subparsers.add_parser("incremental", help="update user embeddings with new WATCHED edges")
+    p.add_argument("--events", default=None, help="csv with userId,movieId columns (stdin if omitted)")
+    p.add_argument("--params", default="best_fastrp_params.json")
+    p.add_argument("--batch-size", type=int, default=1000, help="edges applied at a time")
+    p.add_argument("--rebuild-every", type=int, default=10000,
+                   help="edges after which the embeddings are fully recomputed")
+    p.add_argument("--max-drift", type=float, default=None,
+                   help="rebuild when the sampled L2 error of the cached vectors exceeds this")
+    p.add_argument("--drift-sample", type=int, default=100, help="users sampled by each drift check")
+    p.add_argument("--max-closure-ratio", type=float, default=0.5,
+                   help="use the full projection above this fraction of the graph")
+    p.add_argument("--no-write", action="store_true", help="edges are already in the graph")
+    p.add_argument("--output", default="experiments/incremental_user_embeddings.npz")
+    p.set_defaults(func=cmd_incremental)
+
+    p = subparsers.add_parser("bench", help="retrieval latency benchmark")
+    p.add_argument("--users", type=int, default=6040)
+    p.add_argument("--dim", type=int, default=128)
+    p.add_argument("--items", type=int, default=100)
+    p.add_argument("--length", type=int, default=50)
+    p.add_argument("--backend", choices=("memory", "neo4j"), default="memory",
+                   help="also time the Neo4j vector index on the graph embeddings")
+    p.add_argument("--params", default="best_fastrp_params.json",
+                   help="FastRP params of the graph embeddings (--backend neo4j)")
+    p.set_defaults(func=cmd_bench)
+
+    p = subparsers.add_parser("stats", help="bootstrap intervals and paired tests of per-item metrics")
+    p.add_argument("sources", nargs="+", metavar="METHOD=PATH",
+                   help="per-item metrics of each method (json or parquet)")
+    p.add_argument("--resamples", type=int, default=10000)
+    p.add_argument("--confidence", type=float, default=0.95)
+    p.add_argument("--output", default="experiments/statistics.json")
+    p.set_defaults(func=cmd_stats)
+
+    p = subparsers.add_parser("features", help="sparse side features of the LightFM/GraphSAGE baselines")
+    p.add_argument("--cache-dir", default="notebooks/graphsage_v2",
+                   help="folder of the fitted encoders and cached matrices")
+    p.add_argument("--test-ids", default="experiments/test_ids.json")
+    p.add_argument("--force", action="store_true", help="refit (and overwrite) the encoders and dims.json of --cache-dir")
+    p.set_defaults(func=cmd_features)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
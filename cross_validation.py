@@ -0,0 +1,53 @@
+# K-fold cross-validation of the FastRP hyperparameters over cold items
+import sys
+import json
+import time
+from params_parser import HyperparamValidator, HyperparamCombinator
+from src.node_handler import NodeHandler
+from src.sampler_handler import MovieSampler
+from src.journal_handler import JournalHandler
+from src.cv_handler import ColdItemCrossValidator
+from src.projection_handler import ProjectionRegistry
+
+def main(k=5, nested_dimensions=False, heap_budget_mb=None):
+    with open("config_params.json") as f:
+        data = json.load(f)
+    journal = JournalHandler()
+    node_handler = None
+    projections = ProjectionRegistry(heap_budget_mb)
+    try:
+        projections.open()
+        validated = HyperparamValidator(**data)
+        combinations = HyperparamCombinator(validated).generate_combinations()
+
+        # Keep the Test Set out of the graph, as in main.py
+        sampler = MovieSampler(seed=42)
+        node_handler = NodeHandler(sampler=sampler)
+        journal.recover(node_handler)
+        with open("experiments/test_ids.json", "r", encoding="utf-8") as f:
+            test_ids = [t["movieId"] if isinstance(t, dict) else t for t in json.load(f)]
+        journal.hold(node_handler, "cv:test", test_ids)
+
+        # Every eligible movie outside the Test Set goes to one fold
+        eligible = [m for m in sampler.population["movieId"] if m not in set(test_ids)]
+        validator = ColdItemCrossValidator(combinations, k=k, nested_dimensions=nested_dimensions)
+        summary = validator.run(eligible)
+
+        timestamp = time.strftime("%Y-%m-%d", time.localtime(time.time()))
+        with open(f"experiments/{timestamp}_cv_report.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+        best_config = validator.get_best_config(summary, metric='precision', k=50)
+        print(f"Best configuration for precision at k=50: {best_config}")
+
+        journal.release(node_handler, "cv:test")
+
+    except Exception as e:
+        print(f"Validation error: {e}")
+        if node_handler is not None:
+            journal.recover(node_handler)
+        return 1
+    finally:
+        projections.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
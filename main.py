@@ -2,28 +2,124 @@ import sys
 import json
 import time
 from params_parser import HyperparamValidator, HyperparamCombinator
-from src.node_handler import NodeHandler, NodeSubgraphHandler
-from src.embedding_handler import UserEmbeddingHandler, ItemEmbeddingHandler
+from src.node_handler import NodeHandler, NodeSubgraphHandler, FilteredSubgraphHandler
+from src.embedding_handler import UserEmbeddingHandler, ItemEmbeddingHandler, ItemEmbeddingCache
 from src.vector_search_handler import VectorRetriever
 from src.metrics_handler import EvaluationHandler, ReportHandler
+from src.journal_handler import JournalHandler
+from src.sampler_handler import MovieSampler
+from src.parallel_handler import ShardedEvaluationExecutor, PipelinedItemExecutor
+from src.projection_handler import ProjectionRegistry
 from collections import defaultdict
+from contextlib import nullcontext
 import pandas as pd
 
-def main():  
+def subgraph_context(subgraph_mode, node_handler, movies_id_name, movie_id_caracteristcs, len_hops):
+    """
+    'cypher': one Cypher projection per item (NodeSubgraphHandler).
+    'filtered': one in-memory projection per batch of items and per-item
+    GDS filtered subgraphs of the same nodes (FilteredSubgraphHandler).
+    """
+    if subgraph_mode == "filtered":
+        return FilteredSubgraphHandler(node_handler, movies_id_name, movie_id_caracteristcs, len_hops)
+    if subgraph_mode == "cypher":
+        return nullcontext()
+    raise ValueError(f"Unsupported subgraph mode: {subgraph_mode}")
+
+def create_cold_item_vector(node_handler, node, movie_id_caracteristcs, len_hops,
+                            fasrp_params, subgraphs=None, cache=None, graph_version=None):
+    """
+    Creates the embedding of a held-out movie from its subgraph,
+    leaving the movie out of the graph afterwards. With a cache, movies
+    with the same attribute signature reuse the first computed vector.
+    """
+    if cache is not None:
+        key = cache.key(cache.signature(node["movieId"], movie_id_caracteristcs),
+                        fasrp_params, graph_version)
+        return cache.get_or_create(key, node["movieId"], lambda: create_cold_item_vector(
+            node_handler, node, movie_id_caracteristcs, len_hops, fasrp_params, subgraphs))
+    if subgraphs is not None:
+        with subgraphs.item_subgraph_projection(node["movieId"]) as node_subgraph_projection:
+            print(f"Filtered subgraph projection for node {node['movieId']} created.")
+            node_array = ItemEmbeddingHandler(
+                node_subgraph_projection, node["movieId"], fasrp_params).create_item_vector_array()
+        print(f"Array for node {node['movieId']} created.")
+        return node_array
+    node_handler.recreate_movie_nodes(node)
+    print(f"Node {node['movieId']} recreated.")
+    node_handler.recreate_movie_attribute_rels(
+        movie_id_caracteristcs[movie_id_caracteristcs["movieId"] == node["movieId"]])
+    print(f"Node {node['movieId']} attributes recreated.")
+    sub_graph_handler = NodeSubgraphHandler(node["movieId"], len_hops)
+    print(f"Subgraph for node {node['movieId']} created.")
+    node_subgraph_projection = sub_graph_handler.create_node_subgraph_projection()
+    print(f"Subgraph projection for node {node['movieId']} created.")
+    node_embedding_handler = ItemEmbeddingHandler(
+        node_subgraph_projection, node["movieId"], fasrp_params)
+    print(f"Embeddings for node {node['movieId']} created.")
+    node_array = node_embedding_handler.create_item_vector_array()
+    print(f"Array for node {node['movieId']} created.")
+    node_handler.delete_nodes_and_rels(node["movieId"])
+    print(f"Node {node['movieId']} and its relationships deleted.")
+    return node_array
+
+def prepare_cold_items(nodes, create_item_vector_array, prefetch=0):
+    """
+    Yields (node, item vector array) in order. With prefetch > 0 the
+    embeddings are created by a background thread (Neo4j I/O) while the
+    caller scores the previous items, at most `prefetch` items ahead.
+    """
+    if prefetch:
+        return PipelinedItemExecutor(nodes, create_item_vector_array, max_prefetch=prefetch)
+    return ((node, create_item_vector_array(node)) for node in nodes)
+
+def evaluate_pending_items(pending, user_vectors_array, methods, workers, journal, split):
+    """
+    Scores the items whose embeddings were created in this pass on
+    `workers` processes, journaling each item as in the serial loop.
+    Returns the evaluations in the order of `pending`.
+    """
+    evaluations = []
+    if not pending:
+        return evaluations
+    with ShardedEvaluationExecutor(user_vectors_array, length=50, n_workers=workers) as executor:
+        results = executor.evaluate([node_array for _, node_array in pending], methods)
+    for (node, _), node_evaluations in zip(pending, results):
+        journal.mark_unit_done(split, node["movieId"], node_evaluations)
+        evaluations.extend(node_evaluations)
+    print(f"{len(pending)} nodes evaluated on {workers} workers.")
+    return evaluations
+
+def main(subgraph_mode="cypher", memory_budget_mb=None, workers=None, cache_size=None,
+         prefetch=0, heap_budget_mb=None):  
     # load JSON file with hyperparameters
     with open("config_params.json") as f:
         data = json.load(f)
+    # Write-ahead journal of removed samples and evaluated items,
+    # used to restore the graph and resume an interrupted run
+    journal = JournalHandler()
+    node_handler = None
+    # Every GDS projection created in the run is dropped at the end
+    projections = ProjectionRegistry(heap_budget_mb)
     # Check for hyperparameters and parameters validation before running
     try:
+        projections.open()
         validated = HyperparamValidator(**data)
         combhandler = HyperparamCombinator(validated)
         # All combinations of hyperparameters
         combinations = combhandler.generate_combinations()
 
         # Instanciate NodeHandler with the Neo4j graph database connection
-        # and sampling graph and generate the Test Set 
-        node_handler = NodeHandler()
-        test_ids_names, test_ids_caracteristcs = node_handler.hold_and_remove_movies_sample()
+        # and sampling graph and generate the Test Set. Samples are drawn
+        # in memory from a seeded degree index (reproducible splits)
+        node_handler = NodeHandler(sampler=MovieSampler(seed=42))
+        # Restore samples left out of the graph by an interrupted run
+        recovered = journal.recover(node_handler)
+        if recovered:
+            print(f"Graph restored for {len(recovered)} interrupted sample(s).")
+        # Reuse the test sample of an interrupted run, if any
+        test_ids = journal.held_ids("test") or node_handler.sampling_movie_nodes()
+        test_ids_names, test_ids_caracteristcs = journal.hold(node_handler, "test", test_ids)
         # Save test node IDs for reproducibility on LighFM execution
         # Salvar em um arquivo JSON
         with open('experiments/test_ids.json', 'w', encoding='utf-8') as f:
@@ -33,8 +129,11 @@ def main():
         
         # Unique experiment ID based on timestamp and iteration
         experiment_name = 1
-        timestamp = time.strftime("%Y-%m-%d", time.localtime(time.time()))
+        timestamp = journal.start_run(
+            time.strftime("%Y-%m-%d", time.localtime(time.time())))
         report_builder = ReportHandler(timestamp=timestamp)
+        # Memoized cold item vectors by attribute signature (optional)
+        cache = ItemEmbeddingCache(cache_size) if cache_size else None
 
         # Iterate through all combinations of hyperparameters
         # sampling the remaing nodes and generating the Train/Validation Set
@@ -43,54 +142,67 @@ def main():
             fasrp_params = {k: v for k, v in combination.items() if k != "method"}
             len_hops = len(combination['iterationWeights'])
             search_methods = combination['method']
+            val_split = JournalHandler.split_key(fasrp_params)
+            # Combination already evaluated and reported by an interrupted run
+            if journal.is_split_done(val_split):
+                experiment_name += 1
+                print(f"experiment_name: {experiment_name} restored from journal.")
+                continue
             # Sampling and hold validation set to evaluate current hyperparameters combination
-            val_ids_names, val_ids_caracteristcs = node_handler.hold_and_remove_movies_sample()
+            val_ids = journal.held_ids(val_split) or node_handler.sampling_movie_nodes()
+            val_ids_names, val_ids_caracteristcs = journal.hold(node_handler, val_split, val_ids)
             print("Validation Sampling complete.")
             print(len(val_ids_names), "validation nodes sampled.")
+            done_units = journal.completed_units(val_split)
 
             # Create embeddings for all User nodes remaining in the graph
             # using the current hyperparameters combination
-            embedding_handler = UserEmbeddingHandler(fasrp_params)
+            embedding_handler = UserEmbeddingHandler(fasrp_params, memory_budget_mb)
             user_vectors_array = embedding_handler.create_user_vectors_array()
             print("Embedding created for all users.")
             evaluations = []
-            for node in val_ids_names:
-                node_handler.recreate_movie_nodes(node)
-                print(f"Node {node['movieId']} recreated.")
-                node_handler.recreate_movie_attribute_rels(
-                    val_ids_caracteristcs[val_ids_caracteristcs["movieId"] == node["movieId"]])
-                print(f"Node {node['movieId']} attributes recreated.")
-                sub_graph_handler = NodeSubgraphHandler(node["movieId"], len_hops)
-                print(f"Subgraph for node {node['movieId']} created.")
-                node_subgraph_projection = sub_graph_handler.create_node_subgraph_projection()
-                print(f"Subgraph projection for node {node['movieId']} created.")
-                node_embedding_handler = ItemEmbeddingHandler(
-                    node_subgraph_projection, node["movieId"], fasrp_params)
-                print(f"Embeddings for node {node['movieId']} created.")
-                node_array = node_embedding_handler.create_item_vector_array()
-                print(f"Array for node {node['movieId']} created.")
-                # Iterate through all search methods for the current node
-                for method in search_methods:
-                    print(f"Running with method: {method}.")
-                    node_vec_retriever = VectorRetriever(node_array, user_vectors_array, method=method, length=50)
-                    print('Instantiate VectorRetriever.')
-                    rec_users = node_vec_retriever.retrieve_users()
-                    print('Retrieve users completed.')
-                    node_evaluation = EvaluationHandler(rec_users)
-                    print('Instantiate EvaluationHandler.')
-                    real_users = node_evaluation.retrive_actual_users()
-                    print("Actual users retrieved.")
-                    for k in [10, 20, 50]:
-                        get_metrics = node_evaluation.calculate_metrics(real_users, k)
-                        # During iteration:
-                        evaluations.append({
-                            "cutoff": k,
-                            "precision": get_metrics[0],
-                            "ndcg": get_metrics[1],
-                            "method": method,
-                        })
-                node_handler.delete_nodes_and_rels(node["movieId"])
-                print(f"Node {node['movieId']} and its relationships deleted.")
+            # With workers, embeddings are created here (Neo4j) and
+            # scored afterwards on all cores
+            pending = []
+            graph_version = ItemEmbeddingCache.graph_version(node_handler.removed_ids)
+            with subgraph_context(subgraph_mode, node_handler, val_ids_names, val_ids_caracteristcs,
+                                  len_hops) as subgraphs:
+                for node in val_ids_names:
+                    if node["movieId"] in done_units:
+                        evaluations.extend(done_units[node["movieId"]])
+                        print(f"Node {node['movieId']} restored from journal.")
+                todo = [node for node in val_ids_names if node["movieId"] not in done_units]
+                for node, node_array in prepare_cold_items(todo, lambda node: create_cold_item_vector(
+                        node_handler, node, val_ids_caracteristcs, len_hops, fasrp_params, subgraphs,
+                        cache, graph_version), prefetch):
+                    node_evaluations = []
+                    if workers:
+                        pending.append((node, node_array))
+                        continue
+                    # Iterate through all search methods for the current node
+                    for method in search_methods:
+                        print(f"Running with method: {method}.")
+                        node_vec_retriever = VectorRetriever(node_array, user_vectors_array, method=method, length=50)
+                        print('Instantiate VectorRetriever.')
+                        rec_users = node_vec_retriever.retrieve_users()
+                        print('Retrieve users completed.')
+                        node_evaluation = EvaluationHandler(rec_users)
+                        print('Instantiate EvaluationHandler.')
+                        real_users = node_evaluation.retrive_actual_users()
+                        print("Actual users retrieved.")
+                        for k in [10, 20, 50]:
+                            get_metrics = node_evaluation.calculate_metrics(real_users, k)
+                            # During iteration:
+                            node_evaluations.append({
+                                "cutoff": k,
+                                "precision": get_metrics[0],
+                                "ndcg": get_metrics[1],
+                                "method": method,
+                            })
+                    journal.mark_unit_done(val_split, node["movieId"], node_evaluations)
+                    evaluations.extend(node_evaluations)
+            evaluations.extend(evaluate_pending_items(
+                pending, user_vectors_array, search_methods, workers, journal, val_split))
             
             # Calculate average metrics for group of nodes, metod and cutoff
             grouped = defaultdict(lambda: defaultdict(list))
@@ -121,16 +233,14 @@ def main():
                         metrics=metrics_dict,
                         exp_id=experiment_name
                     )
+            journal.mark_split_done(val_split)
             experiment_name += 1
             print(f"experiment_name: {experiment_name} completed.")
             print("First hiperparameters combination completed.")
             
             # Recreate validation nodes and its attributes and
             # relationships in the graph
-            node_handler.recreate_movie_nodes(val_ids_names)
-            node_handler.recreate_movie_attribute_rels(val_ids_caracteristcs)
-            node_handler.recreate_user_movie_rels(
-                [node["movieId"] for node in val_ids_names])
+            journal.release(node_handler, val_split)
             print("Validation nodes and relationships recreated.")
         
         print("All hyperparameters combinations completed.")
@@ -141,7 +251,7 @@ def main():
         # Parse parameters for the best configuration
         best_fasrp_params = best_config['hyperparams']
         best_method = best_config['retrieval_method']
-        best_len_hops = len(fasrp_params['iterationWeights'])
+        best_len_hops = len(best_fasrp_params['iterationWeights'])
         validation_best_metrics = best_config['metrics']
         # Save the best configruration identified in the validation set
         report_builder.save_report(
@@ -153,49 +263,53 @@ def main():
 
         # Create embeddings for all User nodes remaining in the graph
         # using the current hyperparameters combination
-        embedding_handler = UserEmbeddingHandler(best_fasrp_params)
+        embedding_handler = UserEmbeddingHandler(best_fasrp_params, memory_budget_mb)
         user_vectors_array = embedding_handler.create_user_vectors_array()
         print("Embedding created for all users.")
         
         # Using the best configuration on the Test Set
         evaluations_test = []
-        for node in test_ids_names:
-            node_handler.recreate_movie_nodes(node)
-            print(f"Node {node['movieId']} recreated.")
-            node_handler.recreate_movie_attribute_rels(
-                test_ids_caracteristcs[test_ids_caracteristcs["movieId"] == node["movieId"]])
-            print(f"Node {node['movieId']} attributes recreated.")
-            sub_graph_handler = NodeSubgraphHandler(node["movieId"], best_len_hops)
-            print(f"Subgraph for node {node['movieId']} created.")
-            node_subgraph_projection = sub_graph_handler.create_node_subgraph_projection()
-            print(f"Subgraph projection for node {node['movieId']} created.")
-            node_embedding_handler = ItemEmbeddingHandler(
-                node_subgraph_projection, node["movieId"], best_fasrp_params)
-            print(f"Embeddings for node {node['movieId']} created.")
-            node_array = node_embedding_handler.create_item_vector_array()
-            print(f"Array for node {node['movieId']} created.")
+        done_units = journal.completed_units("test")
+        pending = []
+        graph_version = ItemEmbeddingCache.graph_version(node_handler.removed_ids)
+        with subgraph_context(subgraph_mode, node_handler, test_ids_names, test_ids_caracteristcs,
+                              best_len_hops) as subgraphs:
+            for node in test_ids_names:
+                if node["movieId"] in done_units:
+                    evaluations_test.extend(done_units[node["movieId"]])
+                    print(f"Node {node['movieId']} restored from journal.")
+            todo = [node for node in test_ids_names if node["movieId"] not in done_units]
+            for node, node_array in prepare_cold_items(todo, lambda node: create_cold_item_vector(
+                    node_handler, node, test_ids_caracteristcs, best_len_hops, best_fasrp_params, subgraphs,
+                    cache, graph_version), prefetch):
+                node_evaluations = []
+                if workers:
+                    pending.append((node, node_array))
+                    continue
 
-            # Search users using the best method and parameters
-            print(f"Running with method: {best_method}.")
-            node_vec_retriever = VectorRetriever(node_array, user_vectors_array, method=best_method, length=50)
-            print('Instantiate VectorRetriever.')
-            rec_users = node_vec_retriever.retrieve_users()
-            print('Retrieve users completed.')
-            node_evaluation = EvaluationHandler(rec_users)
-            print('Instantiate EvaluationHandler.')
-            real_users = node_evaluation.retrive_actual_users()
-            print("Actual users retrieved.")
-            for k in [10, 20, 50]:
-                get_metrics = node_evaluation.calculate_metrics(real_users, k)
-                # During iteration:
-                evaluations_test.append({
-                    "cutoff": k,
-                    "precision": get_metrics[0],
-                    "ndcg": get_metrics[1],
-                    "method": best_method,
-                })
-            node_handler.delete_nodes_and_rels(node["movieId"])
-            print(f"Node {node['movieId']} and its relationships deleted.")
+                # Search users using the best method and parameters
+                print(f"Running with method: {best_method}.")
+                node_vec_retriever = VectorRetriever(node_array, user_vectors_array, method=best_method, length=50)
+                print('Instantiate VectorRetriever.')
+                rec_users = node_vec_retriever.retrieve_users()
+                print('Retrieve users completed.')
+                node_evaluation = EvaluationHandler(rec_users)
+                print('Instantiate EvaluationHandler.')
+                real_users = node_evaluation.retrive_actual_users()
+                print("Actual users retrieved.")
+                for k in [10, 20, 50]:
+                    get_metrics = node_evaluation.calculate_metrics(real_users, k)
+                    # During iteration:
+                    node_evaluations.append({
+                        "cutoff": k,
+                        "precision": get_metrics[0],
+                        "ndcg": get_metrics[1],
+                        "method": best_method,
+                    })
+                journal.mark_unit_done("test", node["movieId"], node_evaluations)
+                evaluations_test.extend(node_evaluations)
+        evaluations_test.extend(evaluate_pending_items(
+            pending, user_vectors_array, [best_method], workers, journal, "test"))
         
         # Calculate average metrics for group of nodes, metod and cutoff
         grouped = defaultdict(lambda: defaultdict(list))
@@ -228,17 +342,28 @@ def main():
                 )
         # Recreate Test nodes and its attributes and
         # relationships in the graph
-        node_handler.recreate_movie_nodes(test_ids_names)
-        node_handler.recreate_movie_attribute_rels(test_ids_caracteristcs)
-        node_handler.recreate_user_movie_rels(
-            [node["movieId"] for node in test_ids_names])
+        journal.release(node_handler, "test")
         print("Test nodes and relationships recreated.")
+        if cache is not None:
+            print(f"Item embedding cache: {cache.stats()}")
+        journal.finish_run()
 
 
 
-    # Exception handling for invalid parameters and hyperparameters
+    # Exception handling for invalid parameters and hyperparameters.
+    # Removed samples are put back in the graph; the journal keeps the
+    # evaluated items so the next execution resumes from this point
     except Exception as e:
         print(f"Validation error: {e}")
+        if node_handler is not None:
+            try:
+                journal.recover(node_handler)
+                print("Graph restored from journal.")
+            except Exception as restore_error:
+                print(f"Graph restore failed, it will run on next start: {restore_error}")
+        return 1
+    finally:
+        projections.close()
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
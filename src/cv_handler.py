@@ -0,0 +1,275 @@
+import os
+import json
+import yaml
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from src.gds_connector import get_gds_connection
+from src.projection_handler import admit_projection, track_projection
+from src.embedding_handler import UserEmbeddingHandler, ItemEmbeddingHandler, NestedDimensionEmbeddings
+from src.vector_search_handler import VectorRetriever
+from src.metrics_handler import EvaluationHandler
+
+class ColdItemCrossValidator:
+    """
+    K-fold cross-validation of the hyperparameter combinations over
+    cold items. Each eligible movie is assigned to one fold once (stored
+    in the `cvFold` node property), and folds are evaluated concurrently
+    on the same database: instead of deleting the held-out movies, every
+    fold works on its own GDS projections that leave them out.
+    - inputs:
+        - **combinations**: list of combinations from HyperparamCombinator
+        - **k**: number of folds
+        - **cutoffs**: values of k for Precision@k and NDCG@k
+        - **length**: number of users retrieved per item
+        - **max_workers**: number of folds evaluated at the same time (default k)
+        - **nested_dimensions**: run FastRP once per (normalizationStrength,
+                                 iterationWeights) at the largest embeddingDimension
+                                 and serve the smaller ones as column slices
+    """
+    def __init__(self, combinations, k=5, seed=42, cutoffs=(10, 20, 50), length=50,
+                 folds_path='experiments/cv_folds.json', max_workers=None,
+                 config_path="src/config.yaml", nested_dimensions=False):
+        self.gds = get_gds_connection()
+        self.combinations = combinations
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.cutoffs = cutoffs
+        self.length = length
+        self.folds_path = folds_path
+        self.max_workers = max_workers or k
+        self.config_path = config_path
+        self.nested_dimensions = nested_dimensions
+
+    def assign_folds(self, movie_ids):
+        """
+        Assigns each movie to a fold (shuffled round robin), persists the
+        assignment and writes it as the `cvFold` property of the Movie nodes
+        (removed again at the end of run).
+        An existing assignment file is reused, so folds stay fixed across
+        runs, as long as it was made for the same eligible movies and k;
+        otherwise the folds are reassigned.
+        """
+        eligible = sorted(str(movie_id) for movie_id in movie_ids)
+        folds = None
+        if os.path.exists(self.folds_path):
+            with open(self.folds_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("k") == self.k and stored.get("movie_ids") == eligible:
+                folds = stored["folds"]
+            else:
+                print(f"{self.folds_path} was built for other movies or k, folds reassigned.")
+        if folds is None:
+            shuffled = self.rng.permutation(np.array(eligible, dtype=object))
+            folds = {movie_id: int(i % self.k) for i, movie_id in enumerate(shuffled)}
+            os.makedirs(os.path.dirname(self.folds_path) or ".", exist_ok=True)
+            with open(self.folds_path, "w", encoding="utf-8") as f:
+                json.dump({"k": self.k, "movie_ids": eligible, "folds": folds}, f, indent=4)
+        self.gds.run_cypher("""
+        MATCH (m:Movie) REMOVE m.cvFold
+        WITH count(*) AS cleared
+        UNWIND $folds AS row
+        MATCH (m:Movie { movieId: row.movieId })
+        SET m.cvFold = row.fold
+        """, params={"folds": [{"movieId": m, "fold": f} for m, f in folds.items()]})
+        return folds
+
+    def run(self, movie_ids):
+        """
+        Evaluates every combination on every fold and returns the
+        per-config summary (mean and variance over folds). The `cvFold`
+        property only lives in the graph during the run.
+        """
+        try:
+            folds = self.assign_folds(movie_ids)
+            items_by_fold = defaultdict(list)
+            for movie_id, fold in folds.items():
+                items_by_fold[fold].append(movie_id)
+            projection = self.full_graph_projection()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    executor.submit(self._evaluate_fold, fold, items, projection.name())
+                    for fold, items in sorted(items_by_fold.items())
+                ]
+                evaluations = [e for future in futures for e in future.result()]
+        finally:
+            self.gds.graph.drop('cv_full_graph_projection', False)
+            self.gds.run_cypher("MATCH (m:Movie) WHERE m.cvFold IS NOT NULL REMOVE m.cvFold")
+        return self.summarize(evaluations)
+
+    def full_graph_projection(self):
+        """
+        Native projection of the full graph carrying the `cvFold`
+        property (-1 for every node outside the folds).
+        """
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+        node_projection = {
+            name: {**spec, "properties": {"cvFold": {"property": "cvFold", "defaultValue": -1}}}
+            for name, spec in cfg.get("node_projection").items()
+        }
+        self.gds.graph.drop('cv_full_graph_projection', False)
+        admit_projection(node_projection, cfg.get("relationship_projection"))
+        projection, metadata = self.gds.graph.project(
+            'cv_full_graph_projection',
+            node_projection,
+            cfg.get("relationship_projection")
+        )
+        return track_projection(projection)
+
+    def _evaluate_fold(self, fold, items, full_graph_name):
+        """
+        Evaluates all combinations on one fold. The user embedding and
+        each item embedding are computed once per FastRP run, then reused
+        by every dimension it serves and every retrieval method.
+        """
+        gds = get_gds_connection()
+        fold_graph_name = f"cv_fold{fold}_projection"
+        gds.graph.drop(fold_graph_name, False)
+        fold_graph, _ = gds.graph.filter(
+            fold_graph_name,
+            gds.graph.get(full_graph_name),
+            f"n.cvFold <> {fold}",
+            "*"
+        )
+        track_projection(fold_graph)
+        evaluations = []
+        try:
+            for run_params, combinations in self._embedding_runs():
+                user_handler = UserEmbeddingHandler(run_params)
+                embeddings = user_handler.create_user_fastrp_embeddings(fold_graph)
+                user_ids = user_handler.get_user_node_ids(embeddings)
+                user_vectors_array = user_handler.create_user_vectors(embeddings, user_ids)
+                item_arrays = {}
+                for movie_id in items:
+                    projection = self._item_subgraph_projection(
+                        gds, fold, movie_id, len(run_params['iterationWeights']))
+                    try:
+                        item_arrays[movie_id] = ItemEmbeddingHandler(
+                            projection, movie_id, run_params).create_item_vector_array()
+                    finally:
+                        gds.graph.drop(projection.name(), False)
+                for combination in combinations:
+                    params = {k: v for k, v in combination.items() if k != "method"}
+                    dimension = params['embeddingDimension']
+                    for method in combination['method']:
+                        users_array = NestedDimensionEmbeddings.slice_vectors_array(
+                            user_vectors_array, dimension, method)
+                        for movie_id in items:
+                            node_array = NestedDimensionEmbeddings.slice_vectors_array(
+                                item_arrays[movie_id], dimension, method)
+                            rec_users = VectorRetriever(
+                                node_array, users_array, method=method,
+                                length=self.length).retrieve_users()
+                            node_evaluation = EvaluationHandler(rec_users)
+                            real_users = node_evaluation.retrive_actual_users()
+                            for k in self.cutoffs:
+                                precision, ndcg = node_evaluation.calculate_metrics(real_users, k)
+                                evaluations.append({
+                                    "params": params,
+                                    "method": method,
+                                    "cutoff": k,
+                                    "fold": fold,
+                                    "movieId": movie_id,
+                                    "precision": precision,
+                                    "ndcg": ndcg,
+                                })
+        finally:
+            gds.graph.drop(fold_graph_name, False)
+        print(f"Fold {fold} completed.")
+        return evaluations
+
+    def _embedding_runs(self):
+        """
+        Returns the FastRP runs of a fold as (params, combinations served).
+        One run per combination, or with nested_dimensions one run per
+        (normalizationStrength, iterationWeights) at the largest dimension.
+        """
+        runs = defaultdict(list)
+        for combination in self.combinations:
+            params = {k: v for k, v in combination.items() if k != "method"}
+            if self.nested_dimensions:
+                params.pop('embeddingDimension')
+            runs[json.dumps(params, sort_keys=True)].append(combination)
+        result = []
+        for key, combinations in runs.items():
+            params = json.loads(key)
+            params['embeddingDimension'] = max(c['embeddingDimension'] for c in combinations)
+            result.append((params, combinations))
+        return result
+
+    def _item_subgraph_projection(self, gds, fold, movie_id, hops):
+        """
+        Projects the subgraph around a cold movie as NodeSubgraphHandler
+        does, but without deleting anything: the other movies of the fold
+        and the WATCHED relationships of the target are left out.
+        """
+        result = gds.run_cypher(f"""
+        MATCH (n:Movie {{movieId: $movie_id}})
+        OPTIONAL MATCH p = (n)-[*1..{hops}]-(m)
+        WHERE none(x IN nodes(p)[1..]
+                   WHERE x = n OR (x:Movie AND coalesce(x.cvFold, -1) = $fold))
+          AND none(r IN relationships(p)
+                   WHERE type(r) = 'WATCHED' AND n IN [startNode(r), endNode(r)])
+        WITH id(n) AS targetId, collect(DISTINCT id(m)) AS neighborIds
+        RETURN targetId, [targetId] + neighborIds AS allIds
+        """, params={"movie_id": movie_id, "fold": fold})
+        if result.empty:
+            raise ValueError(f"Movie {movie_id} of fold {fold} is not in the graph")
+        target_id = int(result["targetId"].iloc[0])
+        node_ids = [int(i) for i in result["allIds"].iloc[0] if i is not None]
+
+        node_spec = """
+            UNWIND $nodeIds AS id
+            RETURN id
+        """
+        relationship_spec = """
+            MATCH (n)-[r]-(m)
+            WHERE id(n) IN $nodeIds AND id(m) IN $nodeIds
+              AND NOT (type(r) = 'WATCHED' AND $targetId IN [id(n), id(m)])
+            RETURN id(n) AS source, id(m) AS target, type(r) AS type
+        """
+        graph_name = f"cv_fold{fold}_item{movie_id}"
+        gds.graph.drop(graph_name, False)
+        admit_projection(node_spec, relationship_spec, cypher=True,
+                         parameters={"nodeIds": node_ids, "targetId": target_id})
+        projection, metadata = gds.graph.project.cypher(
+            graph_name,
+            node_spec,
+            relationship_spec,
+            parameters={"nodeIds": node_ids, "targetId": target_id}
+        )
+        return track_projection(projection)
+
+    def summarize(self, evaluations):
+        """
+        Aggregates item metrics into fold means, then into the mean
+        and variance over folds for each (params, method, cutoff).
+        """
+        by_fold = defaultdict(lambda: defaultdict(list))
+        for e in evaluations:
+            key = (json.dumps(e["params"], sort_keys=True), e["method"], e["cutoff"])
+            by_fold[key][e["fold"]].append((e["precision"], e["ndcg"]))
+        summary = []
+        for (params, method, cutoff), folds in by_fold.items():
+            fold_means = np.array([np.mean(v, axis=0) for v in folds.values()])
+            ddof = 1 if len(fold_means) > 1 else 0
+            summary.append({
+                "hyperparams": json.loads(params),
+                "retrieval_method": method,
+                "cutoff": cutoff,
+                "n_folds": len(fold_means),
+                "precision_mean": float(fold_means[:, 0].mean()),
+                "precision_var": float(fold_means[:, 0].var(ddof=ddof)),
+                "ndcg_mean": float(fold_means[:, 1].mean()),
+                "ndcg_var": float(fold_means[:, 1].var(ddof=ddof)),
+            })
+        return summary
+
+    @staticmethod
+    def get_best_config(summary, metric='precision', k=50):
+        """
+        Returns the summary entry with the highest mean metric at k.
+        """
+        candidates = [s for s in summary if s["cutoff"] == k]
+        return max(candidates, key=lambda s: s[f"{metric}_mean"], default=None)
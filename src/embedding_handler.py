@@ -1,28 +1,68 @@
 # Author: José Walter Mota
 # 07/2025
 
-from src.gds_connector import get_gds_connection
+from src.gds_connector import get_gds_connection, get_neo4j_driver
+from src.projection_handler import admit_projection, track_projection
+from src.id_handler import get_id_dictionary
+from numpy.lib.format import open_memmap
+from collections import OrderedDict
+import os
+import json
+import hashlib
+import uuid
 import yaml
 import numpy as np
 
 class UserEmbeddingHandler:
     """
     Encapsulates embedding operations in Neo4j via GDS.
+    - inputs:
+        - **params**: FastRP hyperparameters
+        - **memory_budget_mb**: client memory available for the user vectors.
+                                When set, the GDS estimate is checked against the
+                                server heap and this budget before running, and the
+                                User embeddings are streamed back from the projection
+                                in chunks (see create_user_vectors_chunked) instead
+                                of one DataFrame holding every node.
+        - **mmap_path**: file of the memory-mapped user matrix, used when the
+                         matrix itself does not fit in the budget. By default a
+                         new file per run in mmap_dir, named after the params, so
+                         a matrix still mapped is never overwritten.
     """
-    def __init__(self, params):
+    BYTES_PER_STREAMED_VALUE = 32  # float in a Python list of a DataFrame row
+
+    def __init__(self, params, memory_budget_mb=None, mmap_path=None, mmap_dir='experiments/'):
         self.gds = get_gds_connection()
         self.params = params
+        self.memory_budget = memory_budget_mb * 1024 ** 2 if memory_budget_mb else None
+        self.mmap_path = mmap_path
+        self.mmap_dir = mmap_dir
 
     def create_user_vectors_array(self):
         """
         Project the full graph, generate FastRP embeddings,
-        and return the user ids as a list and their embeddings
-        as a NumPy array.
+        and return the user indices (IdDictionary, int32) and
+        their embeddings as a NumPy array.
         """
         projection = self.full_graph_projection()
+        if self.memory_budget is not None:
+            return self.create_user_vectors_chunked(projection)
         embeddings = self.create_user_fastrp_embeddings(projection)
         user_ids = self.get_user_node_ids(embeddings)
         return self.create_user_vectors(embeddings, user_ids)
+
+    def create_user_and_item_vectors_arrays(self):
+        """
+        Same as create_user_vectors_array, but also returns the Movie
+        embeddings of the same FastRP run (warm-item index) as
+        [movie indices, embeddings].
+        """
+        projection = self.full_graph_projection()
+        embeddings = self.create_user_fastrp_embeddings(projection)
+        user_ids = self.get_user_node_ids(embeddings)
+        movie_ids = self.get_movie_node_ids(embeddings)
+        return (self.create_user_vectors(embeddings, user_ids),
+                self.create_item_vectors(embeddings, movie_ids))
     
     def full_graph_projection(self, config_path="src/config.yaml"):
         # load graph projection configuration from YAML file
@@ -32,13 +72,14 @@ class UserEmbeddingHandler:
         relationship_projection = cfg.get("relationship_projection")
         # check if graph projection already exists and drop it
         self.gds.graph.drop('full_graph_projection', False)
+        admit_projection(node_projection, relationship_projection)
         graph_name = "full_graph_projection"
         projection, metadata = self.gds.graph.project(
             graph_name,
             node_projection,
             relationship_projection
         )
-        return projection
+        return track_projection(projection)
 
     def create_user_fastrp_embeddings(self, projection):
         try:
@@ -47,6 +88,136 @@ class UserEmbeddingHandler:
         except Exception as e:
             raise RuntimeError(f"FastRP failed: {e}")
 
+    def write_user_embeddings(self, projection, write_property='fastrpEmbedding'):
+        """
+        Runs FastRP on the projection (mutate mode, same embeddings as
+        stream) and writes only the User embeddings back as a node
+        property, to be served by a Neo4j vector index.
+        Returns the number of User properties written.
+        """
+        try:
+            self.gds.fastRP.mutate(
+                projection, mutateProperty=write_property, randomSeed=42, **self.params)
+            result = self.gds.graph.nodeProperties.write(
+                projection, [write_property], ['User'])
+        except Exception as e:
+            raise RuntimeError(f"FastRP write failed: {e}")
+        return int(result["propertiesWritten"])
+
+    def check_memory_estimate(self, projection):
+        """
+        Runs the GDS memory estimation of FastRP and refuses, before
+        anything is computed, configurations the server heap cannot hold
+        or whose vectors the client budget cannot receive: the chunked
+        read needs room for at least one streamed row, plus the matrix
+        itself unless it is memory-mapped (see client_memory_plan).
+        """
+        estimate = self.gds.fastRP.mutate.estimate(
+            projection, mutateProperty='fastrpEmbedding', randomSeed=42, **self.params)
+        if float(estimate["heapPercentageMax"]) > 100:
+            raise RuntimeError(
+                f"FastRP needs up to {estimate['requiredMemory']} "
+                f"({estimate['heapPercentageMax']}% of the Neo4j heap) "
+                f"for embeddingDimension={self.params.get('embeddingDimension')}")
+        if self.memory_budget is not None:
+            self.client_memory_plan(int(estimate["nodeCount"]))
+        return estimate
+
+    def client_memory_plan(self, n_rows):
+        """
+        Returns (in_memory, chunk_size) for n_rows user vectors within
+        memory_budget: the matrix is held in RAM when it takes at most
+        half of the budget, otherwise it is memory-mapped. What is left
+        after the matrix and the user indices buffers the streamed rows,
+        twice (driver fetch buffer and current chunk).
+        """
+        dim = int(self.params['embeddingDimension'])
+        row_bytes = dim * self.BYTES_PER_STREAMED_VALUE
+        in_memory = n_rows * dim * 4 <= self.memory_budget // 2
+        chunk_budget = (self.memory_budget - n_rows * 4
+                        - (n_rows * dim * 4 if in_memory else 0)) // 2
+        if chunk_budget < row_bytes:
+            raise RuntimeError(
+                f"A memory budget of {self.memory_budget / 1024 ** 2:.1f} MB cannot stream "
+                f"one FastRP row of {row_bytes} bytes (embeddingDimension={dim})")
+        return in_memory, int(chunk_budget // row_bytes)
+
+    def _new_mmap_path(self):
+        key = hashlib.sha1(json.dumps(self.params, sort_keys=True).encode()).hexdigest()[:12]
+        return os.path.join(self.mmap_dir, f"user_embeddings_{key}_{uuid.uuid4().hex[:8]}.npy")
+
+    def create_user_vectors_chunked(self, projection, mutate_property='fastrpEmbedding'):
+        """
+        Memory-bounded version of create_user_vectors: FastRP is added
+        to the in-memory projection (mutate mode, nothing is written to
+        the database) and the User embeddings are read back from the
+        projection in chunks of rows sized to the budget, straight into
+        a preallocated float32 matrix. When the matrix itself exceeds
+        the budget it is memory-mapped on disk (mmap_path) instead of
+        held in RAM. The property is removed from the projection at the
+        end.
+        """
+        self.check_memory_estimate(projection)
+        try:
+            self.gds.fastRP.mutate(
+                projection, mutateProperty=mutate_property, randomSeed=42, **self.params)
+        except Exception as e:
+            raise RuntimeError(f"FastRP failed: {e}")
+        try:
+            return self._read_user_property_chunked(projection.name(), mutate_property)
+        finally:
+            self.gds.graph.nodeProperties.drop(projection, [mutate_property])
+
+    def _read_user_property_chunked(self, graph_name, node_property):
+        # One stream over the projection, consumed record by record through
+        # the driver: only fetch_size rows are buffered on the client.
+        stream = """
+        CALL gds.graph.nodeProperty.stream($graph, $property, ['User'])
+        YIELD nodeId, propertyValue
+        """
+        params = {"graph": graph_name, "property": node_property}
+        dim = int(self.params['embeddingDimension'])
+        n_users = int(self.gds.run_cypher(
+            stream + "RETURN count(*) AS n", params=params)["n"].iloc[0])
+        in_memory, chunk_size = self.client_memory_plan(n_users)
+        if in_memory:
+            vectors = np.empty((n_users, dim), dtype=np.float32)
+        else:
+            mmap_path = self.mmap_path or self._new_mmap_path()
+            os.makedirs(os.path.dirname(mmap_path) or ".", exist_ok=True)
+            vectors = open_memmap(mmap_path, mode='w+', dtype=np.float32, shape=(n_users, dim))
+            print(f"User matrix ({n_users}x{dim}) memory-mapped to {mmap_path}.")
+        user_ids = np.empty(n_users, dtype=np.int32)
+        ids = get_id_dictionary()
+        row = 0
+        driver = get_neo4j_driver()
+        try:
+            with driver.session(database=self.gds.database(), fetch_size=chunk_size) as session:
+                result = session.run(stream + """
+                RETURN gds.util.asNode(nodeId).userId AS userId, propertyValue AS embedding
+                """, params)
+                chunk_ids, chunk_vectors = [], []
+                for record in result:
+                    chunk_ids.append(record["userId"])
+                    chunk_vectors.append(record["embedding"])
+                    if len(chunk_ids) == chunk_size:
+                        row = self._store_chunk(user_ids, vectors, row, chunk_ids, chunk_vectors, ids)
+                        chunk_ids, chunk_vectors = [], []
+                if chunk_ids:
+                    row = self._store_chunk(user_ids, vectors, row, chunk_ids, chunk_vectors, ids)
+        finally:
+            driver.close()
+        if isinstance(vectors, np.memmap):
+            vectors.flush()
+        return [user_ids[:row], vectors[:row]]
+
+    @staticmethod
+    def _store_chunk(user_ids, vectors, row, chunk_ids, chunk_vectors, ids):
+        end = min(len(user_ids), row + len(chunk_ids))
+        user_ids[row:end] = ids.encode_users(np.asarray(chunk_ids)[:end - row])
+        vectors[row:end] = np.asarray(chunk_vectors, dtype=np.float32)[:end - row]
+        return end
+
     def get_user_node_ids(self, embedding_df):
         query = """
         UNWIND $node_ids AS id
@@ -57,13 +228,32 @@ class UserEmbeddingHandler:
         return self.gds.run_cypher(query, {'node_ids':
                             [id for id in embedding_df['nodeId']]})
 
+    def get_movie_node_ids(self, embedding_df):
+        query = """
+        UNWIND $node_ids AS id
+        MATCH (n)
+        WHERE id(n) = id AND 'Movie' IN labels(n)
+        RETURN id(n) AS nodeId, n.movieId AS movieId
+        """
+        return self.gds.run_cypher(query, {'node_ids':
+                            [id for id in embedding_df['nodeId']]})
+
+    def create_item_vectors(self, dfembedding, dfids):
+        """
+        Creates arrays of warm item vectors and their movie indices (IdDictionary).
+        """
+        dfjoin = dfembedding.merge(dfids, how='inner', on='nodeId'
+                          )[['movieId','embedding']]
+        return [get_id_dictionary().encode_movies(dfjoin["movieId"].to_numpy()), \
+            np.stack(dfjoin["embedding"].values)]
+
     def create_user_vectors(self, dfembedding, dfids):
         """
-        Creates arrays of user vectors and a list of their original user IDs.
+        Creates arrays of user vectors and their user indices (IdDictionary).
         """
         dfjoin = dfembedding.merge(dfids, how='inner', on='nodeId'
                           )[['userId','embedding']]
-        return [dfjoin["userId"].astype('int64').to_numpy(), \
+        return [get_id_dictionary().encode_users(dfjoin["userId"].to_numpy()), \
             np.stack(dfjoin["embedding"].values)]
 
 class ItemEmbeddingHandler:
@@ -77,10 +267,13 @@ class ItemEmbeddingHandler:
         self.params = params
 
     def create_item_vector_array(self):
+        """
+        Returns [movie index (IdDictionary), vector] of the target movie.
+        """
         subgraph_vectors = self.create_item_fastrp_embedding()
         item_vector = self.filter_target_embedding(subgraph_vectors)
         item_id = self.get_item_node_id()
-        return [np.array(item_id), np.array(item_vector)]
+        return [get_id_dictionary().encode_movies(np.array(item_id)), np.array(item_vector)]
 
     def create_item_fastrp_embedding(self):
         try:
@@ -108,3 +301,351 @@ class ItemEmbeddingHandler:
         return self.gds.run_cypher(query, {'node_id': self.target_node_id}
                                    )["nodeId"].iloc[0]
 
+
+class NestedDimensionEmbeddings:
+    """
+    Serves smaller embeddingDimension values from one FastRP run at the
+    largest dimension. Random-projection coordinates are independent, so
+    with a fixed seed the first d columns are a d-dimensional random
+    projection of the same propagation (statistically equivalent to, not
+    bit-identical with, a GDS run at dimension d, which draws its own
+    sparse projection and normalizes over its own d coordinates).
+    """
+    @staticmethod
+    def slice_vectors(vectors, dimension, method='cosine'):
+        """
+        First `dimension` columns of a 1D or 2D embedding array. Cosine is
+        scale invariant, so the slice is a zero-copy view; for euclidean
+        each row is rescaled to the norm of its full vector, as FastRP
+        normalizes every iteration over the whole embedding.
+        """
+        vectors = np.asarray(vectors)
+        if dimension >= vectors.shape[-1]:
+            return vectors
+        view = vectors[..., :dimension]
+        if method != 'euclidean':
+            return view
+        full = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        part = np.linalg.norm(view, axis=-1, keepdims=True)
+        part[part == 0] = 1.0
+        return view * (full / part)
+
+    @staticmethod
+    def slice_vectors_array(vectors_array, dimension, method='cosine'):
+        """
+        Same for [ids, embeddings] arrays (users or items).
+        """
+        return [vectors_array[0],
+                NestedDimensionEmbeddings.slice_vectors(vectors_array[1], dimension, method)]
+
+class ItemEmbeddingCache:
+    """
+    LRU memoization of cold item vectors. A held-out movie only reaches
+    the graph through its attribute relationships (genres and release),
+    so movies with the same attribute signature, FastRP params and graph
+    version (set of movies currently removed) share one FastRP run.
+    With several iterations the target's own random vector still flows
+    back through its neighbours, so a hit is a close approximation of
+    the vector that would be computed, not a bit-exact copy.
+    - inputs:
+        - **max_size**: number of vectors kept (least recently used evicted)
+    """
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(movie_id, movie_id_caracteristcs):
+        """
+        Sorted (attribute, value) pairs of the movie, as extracted
+        by NodeHandler.extract_movie_nodes_relations.
+        """
+        rows = movie_id_caracteristcs[movie_id_caracteristcs["movieId"] == movie_id]
+        return tuple(sorted(set(zip(rows["attributeType"], rows["attributeValue"].astype(str)))))
+
+    @staticmethod
+    def graph_version(removed_ids):
+        """
+        Fingerprint of the graph state: the movies removed from it.
+        """
+        return hashlib.sha1(json.dumps(sorted(removed_ids)).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def key(signature, params, graph_version):
+        return (signature, json.dumps(params, sort_keys=True), graph_version)
+
+    def get_or_create(self, key, item_id, create_item_vector_array):
+        """
+        Returns [movie index, vector] from the cache, or calls
+        create_item_vector_array() and stores its vector.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return [get_id_dictionary().encode_movies(np.array(item_id)), self.entries[key]]
+        self.misses += 1
+        item_array = create_item_vector_array()
+        self.entries[key] = item_array[1]
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return item_array
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self.entries),
+        }
+
+class IncrementalUserEmbeddingHandler:
+    """
+    Keeps a cached user embedding array up to date as new WATCHED
+    edges arrive. After L iterations the FastRP vector of a node only
+    depends on its L-hop neighbourhood (and on the degrees of those
+    nodes), so only the users within L hops of the endpoints of the new
+    edges change. Their vectors are recomputed on the subgraph induced
+    by the unpruned (L+1)-hop neighbourhood around them, which holds
+    every node, relationship and degree the full-graph run uses for
+    them. When that subgraph covers more than max_closure_ratio of the
+    graph (hubs such as Gender or Age reach most users in a few hops),
+    FastRP runs on the full projection instead and only the affected
+    rows are copied. Random vectors depend on randomSeed and the Neo4j
+    node id, so the patched rows are in the same space as the cached
+    ones. The error is bounded by max_drift: after every batch the
+    cached rows of a sample of users are compared with their exact
+    vectors and the cache is fully rebuilt when the largest L2 distance
+    exceeds the bound (each check costs one more FastRP run, on the
+    full projection when the sample reaches the hubs). last_drift holds
+    the last measurement, also taken at every rebuild.
+    - inputs:
+        - **params**: FastRP hyperparameters (same used to build the cache)
+        - **user_vectors_array**: [user indices, embeddings] as returned by
+                                  UserEmbeddingHandler.create_user_vectors_array
+        - **max_closure_ratio**: fraction of the graph nodes above which the
+                                 full projection is used
+        - **rebuild_every**: number of applied edges after which the cache is
+                             fully rebuilt and the drift measured
+        - **max_drift**: largest L2 distance allowed between a sampled cached
+                         row and its exact vector (None: not checked)
+        - **drift_sample**: number of users sampled by each drift check
+    """
+    def __init__(self, params, user_vectors_array, max_closure_ratio=0.5, rebuild_every=10000,
+                 max_drift=None, drift_sample=100, config_path="src/config.yaml"):
+        self.gds = get_gds_connection()
+        self.params = params
+        self.hops = len(params['iterationWeights'])
+        self.max_closure_ratio = max_closure_ratio
+        self.rebuild_every = rebuild_every
+        self.max_drift = max_drift
+        self.drift_sample = drift_sample
+        self.edges_since_rebuild = 0
+        self.rebuilds = 0
+        self.last_drift = None
+        self.rng = np.random.default_rng(42)
+        with open(config_path, "r", encoding="utf-8") as f:
+            self.rel_types = list(yaml.safe_load(f).get("relationship_projection"))
+        self.user_vectors_array = user_vectors_array
+        self.ids = get_id_dictionary()
+        self.row_of_user = self._row_of_user(user_vectors_array[0])
+
+    def _row_of_user(self, user_indices):
+        """
+        Row of each user index in the cached array (-1: not cached).
+        """
+        row_of_user = np.full(self.ids.n_users, -1, dtype=np.int64)
+        row_of_user[user_indices] = np.arange(len(user_indices))
+        return row_of_user
+
+    def apply_watch_events(self, edges, write=True):
+        """
+        Applies a batch of new (userId, movieId) edges: writes them to
+        the graph (unless already written), refreshes the vectors of the
+        affected users and returns the updated user vectors array. The
+        cache is then fully rebuilt if rebuild_every edges were applied
+        since the last rebuild or if the sampled drift exceeds max_drift.
+        """
+        rels = [{"userId": str(u), "movieId": str(m)} for u, m in edges]
+        if write:
+            self.gds.run_cypher("""
+            UNWIND $relations AS rel
+            MATCH (u:User  { userId: rel.userId })
+            MATCH (m:Movie { movieId: rel.movieId })
+            MERGE (u)-[:WATCHED]->(m)
+            """, params={"relations": rels})
+        affected = self.get_affected_users(rels)
+        if not affected.empty:
+            self.update_user_vectors(affected)
+        self.edges_since_rebuild += len(rels)
+        if self.edges_since_rebuild >= self.rebuild_every:
+            return self.full_rebuild()
+        if self.max_drift is not None:
+            self.last_drift = self.sampled_drift()
+            if self.last_drift > self.max_drift:
+                print(f"Sampled drift {self.last_drift:.3e} above {self.max_drift:.3e}, rebuilding.")
+                return self.full_rebuild()
+        return self.user_vectors_array
+
+    def full_rebuild(self):
+        """
+        Recomputes every user vector from the full graph projection and
+        stores in last_drift the largest L2 distance between a cached
+        row and its rebuilt value.
+        """
+        rebuilt = UserEmbeddingHandler(self.params).create_user_vectors_array()
+        self.last_drift = self.drift(rebuilt)
+        print(f"Incremental drift before rebuild: max ||v_incremental - v_full|| = {self.last_drift:.3e}")
+        self.user_vectors_array = rebuilt
+        self.row_of_user = self._row_of_user(self.user_vectors_array[0])
+        self.edges_since_rebuild = 0
+        self.rebuilds += 1
+        return self.user_vectors_array
+
+    def sampled_drift(self):
+        """
+        Largest L2 distance between the cached rows of drift_sample
+        random users and their exact vectors on the current graph.
+        """
+        user_array, vectors = self.user_vectors_array
+        if len(user_array) == 0:
+            return 0.0
+        rows = self.rng.choice(len(user_array), size=min(self.drift_sample, len(user_array)),
+                               replace=False)
+        sample = self.gds.run_cypher("""
+        UNWIND $userIds AS uid
+        MATCH (n:User { userId: uid })
+        RETURN id(n) AS nodeId, n.userId AS userId
+        """, params={"userIds": [str(u) for u in self.ids.decode_users(user_array[rows])]})
+        if sample.empty:
+            return 0.0
+        exact = self.compute_user_vectors(sample)
+        cached = np.asarray(vectors)[self.row_of_user[self.ids.encode_users(exact["userId"].to_numpy())]]
+        return float(np.linalg.norm(cached - np.stack(exact["embedding"].values), axis=1).max())
+
+    def drift(self, reference=None):
+        """
+        Largest L2 distance between the cached rows and the rows of a
+        full-graph run (computed if not given), over the common users.
+        """
+        if reference is None:
+            reference = UserEmbeddingHandler(self.params).create_user_vectors_array()
+        user_array, vectors = self.user_vectors_array
+        reference_rows = np.full(self.ids.n_users, -1, dtype=np.int64)
+        reference_rows[reference[0]] = np.arange(len(reference[0]))
+        rows = reference_rows[user_array]
+        known = rows >= 0
+        if not known.any():
+            return 0.0
+        diff = np.asarray(vectors)[known] - np.asarray(reference[1])[rows[known]]
+        return float(np.linalg.norm(diff, axis=1).max())
+
+    def _neighbourhood(self, node_ids, radius, limit=None):
+        """
+        Neo4j ids of the nodes within `radius` hops of the given nodes,
+        over the projected relationship types, without pruning. Returns
+        None as soon as more than `limit` nodes are reached.
+        """
+        nodes = set(node_ids)
+        frontier = list(node_ids)
+        for _ in range(radius):
+            if not frontier:
+                break
+            result = self.gds.run_cypher("""
+            UNWIND $frontier AS nid
+            MATCH (n)-[r]-(m)
+            WHERE id(n) = nid AND type(r) IN $types
+            RETURN DISTINCT id(m) AS id
+            """, params={"frontier": frontier, "types": self.rel_types})
+            frontier = [i for i in result["id"].tolist() if i not in nodes]
+            nodes.update(frontier)
+            if limit is not None and len(nodes) > limit:
+                return None
+        return nodes
+
+    def get_affected_users(self, rels):
+        """
+        Returns (nodeId, userId) of every user within L hops of the
+        endpoints of the new edges: the users whose vectors change.
+        """
+        endpoints = self.gds.run_cypher("""
+        UNWIND $relations AS rel
+        MATCH (u:User  { userId: rel.userId })
+        MATCH (m:Movie { movieId: rel.movieId })
+        UNWIND [id(u), id(m)] AS id
+        RETURN DISTINCT id
+        """, params={"relations": rels})["id"].tolist()
+        nodes = self._neighbourhood(endpoints, self.hops)
+        return self.gds.run_cypher("""
+        UNWIND $nodeIds AS nid
+        MATCH (n:User) WHERE id(n) = nid
+        RETURN id(n) AS nodeId, n.userId AS userId
+        """, params={"nodeIds": list(nodes)})
+
+    def compute_user_vectors(self, users):
+        """
+        Exact vectors of the given users (nodeId, userId), from FastRP
+        on their (L+1)-hop neighbourhood or on the full projection.
+        Returns a DataFrame of userId and embedding.
+        """
+        n_nodes = int(self.gds.run_cypher("MATCH (n) RETURN count(n) AS n")["n"].iloc[0])
+        nodes = self._neighbourhood(users["nodeId"].tolist(), self.hops + 1,
+                                    limit=self.max_closure_ratio * n_nodes)
+        user_handler = UserEmbeddingHandler(self.params)
+        if nodes is None:
+            projection = user_handler.full_graph_projection()
+        else:
+            projection = self.affected_subgraph_projection(nodes)
+        embeddings = user_handler.create_user_fastrp_embeddings(projection)
+        self.gds.graph.drop(projection.name(), False)
+        return embeddings.merge(users, how='inner', on='nodeId')[['userId', 'embedding']]
+
+    def update_user_vectors(self, affected):
+        """
+        Recomputes the vectors of the affected users and overwrites (or
+        appends) their rows in the cached array.
+        """
+        dfjoin = self.compute_user_vectors(affected)
+        user_array, vectors = self.user_vectors_array
+        # users created after the dictionary was built get new indices
+        user_indices = self.ids.encode_users(dfjoin["userId"].to_numpy(), add=True)
+        new_vectors = np.stack(dfjoin["embedding"].values)
+        if len(self.row_of_user) < self.ids.n_users:
+            self.row_of_user = np.concatenate([
+                self.row_of_user,
+                np.full(self.ids.n_users - len(self.row_of_user), -1, dtype=np.int64)])
+        rows = self.row_of_user[user_indices]
+        known = rows >= 0
+        vectors[rows[known]] = new_vectors[known]
+        if not known.all():
+            self.row_of_user[user_indices[~known]] = len(user_array) + np.arange((~known).sum())
+            user_array = np.concatenate([user_array, user_indices[~known]])
+            vectors = np.vstack([vectors, new_vectors[~known]])
+        self.user_vectors_array = [user_array, vectors]
+
+    def affected_subgraph_projection(self, node_ids):
+        """
+        Projects the subgraph induced by the given nodes, with the
+        relationship types of the full projection, undirected.
+        """
+        node_spec = """
+            UNWIND $nodeIds AS id
+            RETURN id
+        """
+        relationship_spec = """
+            MATCH (n)-[r]-(m)
+            WHERE id(n) IN $nodeIds AND id(m) IN $nodeIds AND type(r) IN $types
+            RETURN id(n) AS source, id(m) AS target, type(r) AS type
+        """
+        self.gds.graph.drop('incremental_user_projection', False)
+        admit_projection(node_spec, relationship_spec, cypher=True,
+                         parameters={"nodeIds": list(node_ids), "types": self.rel_types})
+        projection, metadata = self.gds.graph.project.cypher(
+            "incremental_user_projection",
+            node_spec,
+            relationship_spec,
+            parameters={"nodeIds": list(node_ids), "types": self.rel_types}
+        )
+        return track_projection(projection)
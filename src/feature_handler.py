@@ -0,0 +1,224 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import joblib
+from scipy import sparse
+from sklearn.preprocessing import OneHotEncoder, StandardScaler, MultiLabelBinarizer
+
+class SparseFeatureHandler:
+    """
+    User and item side features of the LightFM and GraphSAGE baselines
+    as scipy CSR matrices, built from the csv files used to build the
+    knowledge graph (replaces the dense OneHotEncoder + np.hstack cells
+    of the notebooks). Memory grows with the non-zeros, not with the
+    zipcode/occupation/release vocabularies.
+    - inputs:
+        - **data_path**: folder with the csv files (ageRel, genderRel,
+                         occupationRel, residesRel, releaseRel, genreRel)
+        - **cache_dir**: folder of the fitted encoders (*.joblib, same names
+                         as the notebook) and of the cached matrices (*.npz)
+    - features: users [scaled age, one-hot gender/occupation/zipcode],
+                items [one-hot release, multi-hot genres]. GraphSAGE nodes
+                are users then items, each padded with empty columns of the
+                other block (block diagonal).
+    """
+    ENCODERS = ("ohe_user", "sc_user_age", "ohe_release", "mlb_genres")
+
+    def __init__(self, data_path='data/', cache_dir='notebooks/graphsage_v2'):
+        self.data_path = data_path
+        self.cache_dir = cache_dir
+        self.encoders = {}
+        self._users = None
+        self._items = None
+
+    def _path(self, file_name):
+        return os.path.join(self.cache_dir, file_name)
+
+    def user_table(self):
+        """
+        One row per user (userId as string) with age, gender, occupation and zipcode.
+        """
+        if self._users is None:
+            users = None
+            for attribute, file_name in (("age", "ageRel.csv"), ("gender", "genderRel.csv"),
+                                         ("occupation", "occupationRel.csv"),
+                                         ("zipcode", "residesRel.csv")):
+                rel = pd.read_csv(self.data_path + file_name, dtype=str)
+                rel = rel.drop_duplicates("userId").set_index("userId")[attribute]
+                users = rel.to_frame() if users is None else users.join(rel, how="outer")
+            self._users = users.fillna("")
+        return self._users
+
+    def item_table(self):
+        """
+        One row per movie (movieId as string) with its release date and list of genres.
+        """
+        if self._items is None:
+            release = pd.read_csv(self.data_path + 'releaseRel.csv', dtype=str)
+            genres = pd.read_csv(self.data_path + 'genreRel.csv', dtype=str)
+            items = release.drop_duplicates("movieId").set_index("movieId")[["releaseDate"]]
+            items = items.join(genres.groupby("movieId")["genreDesc"].apply(list), how="outer")
+            items["releaseDate"] = items["releaseDate"].fillna("")
+            items["genreDesc"] = [g if isinstance(g, list) else [] for g in items["genreDesc"]]
+            self._items = items
+        return self._items
+
+    @staticmethod
+    def training_ids(interactions_path='data/ml-100k/u.data',
+                     test_ids_path='experiments/test_ids.json'):
+        """
+        Users and items of the GraphSAGE training graph, in the order of
+        the notebook (ids sorted as strings, test items excluded), so the
+        rows match edge_index_train.pt.
+        """
+        interactions = pd.read_csv(interactions_path, sep='\t', dtype=str,
+                                   names=['user_id', 'item_id', 'rating', 'timestamp'])
+        with open(test_ids_path, 'r', encoding='utf-8') as f:
+            test_ids = {str(item['movieId']) for item in json.load(f)}
+        train = interactions[~interactions['item_id'].isin(test_ids)]
+        return sorted(train['user_id'].unique().tolist()), sorted(train['item_id'].unique().tolist())
+
+    def load_encoders(self):
+        """
+        Loads the fitted encoders from cache_dir, switched to sparse
+        output (encoders saved by the notebook were fitted dense).
+        Returns False if any of them is missing.
+        """
+        paths = {name: self._path(f"{name}.joblib") for name in self.ENCODERS}
+        if not all(os.path.exists(p) for p in paths.values()):
+            return False
+        self.encoders = {name: joblib.load(path) for name, path in paths.items()}
+        self.encoders["ohe_user"].sparse_output = True
+        self.encoders["ohe_release"].sparse_output = True
+        self.encoders["mlb_genres"].sparse_output = True
+        return True
+
+    def fit(self, user_ids, item_ids):
+        """
+        Fits the encoders on the training users and items and saves them.
+        """
+        users = self.user_table().reindex([str(u) for u in user_ids]).fillna("")
+        items = self.item_table().reindex([str(i) for i in item_ids])
+        ages = pd.to_numeric(users["age"], errors="coerce").fillna(0).to_numpy().reshape(-1, 1)
+        self.encoders = {
+            "ohe_user": OneHotEncoder(sparse_output=True, handle_unknown='ignore').fit(
+                users[["gender", "occupation", "zipcode"]].to_numpy()),
+            "sc_user_age": StandardScaler().fit(ages),
+            "ohe_release": OneHotEncoder(sparse_output=True, handle_unknown='ignore').fit(
+                items["releaseDate"].fillna("").to_numpy().reshape(-1, 1)),
+            "mlb_genres": MultiLabelBinarizer(sparse_output=True).fit(
+                [g if isinstance(g, list) else [] for g in items["genreDesc"]]),
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for name, encoder in self.encoders.items():
+            joblib.dump(encoder, self._path(f"{name}.joblib"))
+        return self
+
+    def user_features(self, user_ids):
+        """
+        CSR matrix (n_users, D_user): [scaled age, one-hot gender/occupation/zipcode].
+        """
+        users = self.user_table().reindex([str(u) for u in user_ids]).fillna("")
+        ages = pd.to_numeric(users["age"], errors="coerce").fillna(0).to_numpy().reshape(-1, 1)
+        return sparse.hstack([
+            sparse.csr_matrix(self.encoders["sc_user_age"].transform(ages)),
+            self.encoders["ohe_user"].transform(users[["gender", "occupation", "zipcode"]].to_numpy())
+        ], format="csr", dtype=np.float32)
+
+    def item_features(self, item_ids):
+        """
+        CSR matrix (n_items, D_item): [one-hot release, multi-hot genres].
+        Unseen release dates and genres map to empty columns, so cold
+        items can use the encoders fitted on the training items.
+        """
+        items = self.item_table().reindex([str(i) for i in item_ids])
+        known_genres = set(self.encoders["mlb_genres"].classes_)
+        genre_lists = [
+            [g for g in genres if g in known_genres] if isinstance(genres, list) else []
+            for genres in items["genreDesc"]
+        ]
+        return sparse.hstack([
+            self.encoders["ohe_release"].transform(
+                items["releaseDate"].fillna("").to_numpy().reshape(-1, 1)),
+            self.encoders["mlb_genres"].transform(genre_lists)
+        ], format="csr", dtype=np.float32)
+
+    def node_features(self, user_features, item_features):
+        """
+        GraphSAGE input (users then items) as the block diagonal of the
+        user and item matrices: the zero padding is never stored.
+        """
+        return sparse.block_diag([user_features, item_features], format="csr", dtype=np.float32)
+
+    def build(self, user_ids, item_ids, force=False):
+        """
+        Returns (user_features, item_features, node_features) of the
+        training users and items. Matrices are read from cache_dir when
+        they were built for the same ids. Otherwise the encoders already
+        in cache_dir (e.g. the ones trained by the notebook) are loaded
+        and only transform the features; they are fitted, and saved, only
+        when missing or with force=True. Without force, the dimensions
+        must match an existing dims.json, which is never overwritten.
+        """
+        user_ids = [str(u) for u in user_ids]
+        item_ids = [str(i) for i in item_ids]
+        index_path = self._path("feature_ids.json")
+        names = ("user_features_train", "item_features_train", "X_all_train")
+        if force or not self.load_encoders():
+            self.fit(user_ids, item_ids)
+        elif os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached == {"user_ids": user_ids, "item_ids": item_ids} and \
+                    all(os.path.exists(self._path(f"{n}.npz")) for n in names):
+                return tuple(sparse.load_npz(self._path(f"{n}.npz")).tocsr() for n in names)
+        user_features = self.user_features(user_ids)
+        item_features = self.item_features(item_ids)
+        X_all = self.node_features(user_features, item_features)
+        dims = {"n_users": len(user_ids), "n_train_items": len(item_ids),
+                "feature_dim": X_all.shape[1], "D_user": user_features.shape[1],
+                "D_item": item_features.shape[1]}
+        dims_path = self._path("dims.json")
+        write_dims = force or not os.path.exists(dims_path)
+        if not write_dims:
+            with open(dims_path, "r", encoding="utf-8") as f:
+                expected = json.load(f)
+            mismatch = {k: (expected[k], v) for k, v in dims.items() if k in expected and expected[k] != v}
+            if mismatch:
+                raise ValueError(
+                    f"Features do not match {dims_path} (expected, built): {mismatch}; "
+                    "use another cache_dir or force=True to refit the encoders")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for name, matrix in zip(names, (user_features, item_features, X_all)):
+            sparse.save_npz(self._path(f"{name}.npz"), matrix)
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump({"user_ids": user_ids, "item_ids": item_ids}, f)
+        if write_dims:
+            with open(dims_path, "w", encoding="utf-8") as f:
+                json.dump(dims, f)
+        print(f"Features: {X_all.shape[0]} nodes x {X_all.shape[1]} columns, "
+              f"{X_all.nnz} non-zeros ({X_all.nnz / max(1, np.prod(X_all.shape)):.2%} dense).")
+        return user_features, item_features, X_all
+
+    @staticmethod
+    def with_identity(features):
+        """
+        Prepends one identity column per row, as lightfm.data.Dataset does
+        by default, to use the matrices as LightFM user/item features.
+        """
+        return sparse.hstack([sparse.identity(features.shape[0], dtype=np.float32, format="csr"),
+                              features], format="csr")
+
+    @staticmethod
+    def to_torch(features):
+        """
+        Converts a scipy sparse matrix to a torch sparse CSR tensor
+        (float32), sharing no dense copy of the features.
+        """
+        import torch
+        csr = sparse.csr_matrix(features, dtype=np.float32)
+        return torch.sparse_csr_tensor(
+            torch.from_numpy(csr.indptr.astype(np.int64)),
+            torch.from_numpy(csr.indices.astype(np.int64)),
+            torch.from_numpy(csr.data), size=csr.shape)
@@ -2,19 +2,22 @@
 # 07/2025
 """
 Establish and return a Graph Data Science client.
-Reads config from config.yaml file.
+Reads config from config.yaml file. The configuration files and the
+graphdatascience client are only loaded when a connection is requested,
+so importing this module is cheap.
 """
-import os
 import yaml
-from graphdatascience import GraphDataScience
 
-with open('src/config.yaml', 'r') as f:
-    config = yaml.safe_load(f)
+def load_config(config_path='src/config.yaml', pwd_path='src/pwd.yaml'):
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    with open(pwd_path, 'r') as f:
+        configpass = yaml.safe_load(f)
+    return config, configpass
 
-with open('src/pwd.yaml', 'r') as f:
-    configpass = yaml.safe_load(f)
-
-def get_gds_connection() -> GraphDataScience:
+def get_gds_connection():
+    from graphdatascience import GraphDataScience
+    config, configpass = load_config()
     uri = config['neo4j']['uri']
     user = config['neo4j']['user']
     pwd = configpass['neo4j']['pwd']
@@ -28,3 +31,21 @@ def get_gds_connection() -> GraphDataScience:
 
     except Exception as e:
         raise ConnectionError(f"Failed to connect to GDS: {e}")
+
+def get_neo4j_driver():
+    """
+    Plain Neo4j driver on the same database, for queries whose result is
+    consumed record by record (run_cypher of the GDS client returns the
+    whole result as one DataFrame). The caller closes it.
+    """
+    from neo4j import GraphDatabase
+    config, configpass = load_config()
+    uri = config['neo4j']['uri']
+    user = config['neo4j']['user']
+    pwd = configpass['neo4j']['pwd']
+    try:
+        driver = GraphDatabase.driver(uri, auth=(user, pwd))
+        driver.verify_connectivity()
+        return driver
+    except Exception as e:
+        raise ConnectionError(f"Failed to connect to Neo4j: {e}")
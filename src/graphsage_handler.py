@@ -0,0 +1,208 @@
+import os
+import re
+import glob
+import json
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import joblib
+import torch
+import torch.nn.functional as F
+from scipy import sparse
+from torch_geometric.nn import SAGEConv
+from torch_geometric.utils import spmm
+from src.feature_handler import SparseFeatureHandler
+
+class GraphSAGEEncoder(torch.nn.Module):
+    """
+    GraphSAGE encoder trained in notebooks/graphsage_v2/graphsagev2.ipynb.
+    The architecture must match the saved checkpoints.
+    """
+    def __init__(self, in_dim, hidden_dim=128, out_dim=64, num_layers=2):
+        super().__init__()
+        self.convs = torch.nn.ModuleList()
+        if num_layers == 1:
+            self.convs.append(SAGEConv(in_dim, out_dim))
+        else:
+            self.convs.append(SAGEConv(in_dim, hidden_dim))
+            for _ in range(num_layers-2):
+                self.convs.append(SAGEConv(hidden_dim, hidden_dim))
+            self.convs.append(SAGEConv(hidden_dim, out_dim))
+        self.act = torch.nn.ReLU()
+
+    @staticmethod
+    def _sparse_conv(conv, x, adj_t):
+        """
+        SAGEConv (mean aggregation, as trained) on sparse input features:
+        both linear maps are applied to the sparse rows first, and the
+        mean over neighbours is taken on the projected rows, so the
+        input is never densified.
+        """
+        out = spmm(adj_t, torch.sparse.mm(x, conv.lin_l.weight.t()), reduce='mean')
+        if conv.lin_l.bias is not None:
+            out = out + conv.lin_l.bias
+        if conv.root_weight:
+            out = out + torch.sparse.mm(x, conv.lin_r.weight.t())
+        if conv.normalize:
+            out = F.normalize(out, p=2., dim=-1)
+        return out
+
+    def forward(self, x, edge_index):
+        for i, conv in enumerate(self.convs):
+            if x.layout != torch.strided:
+                x = self._sparse_conv(conv, x, edge_index)
+            else:
+                x = conv(x, edge_index)
+            if i < len(self.convs) - 1:
+                x = self.act(x)
+        return F.normalize(x, p=2, dim=-1)
+
+class GraphSAGEInferenceHandler:
+    """
+    Batched inductive inference of cold item embeddings with every saved
+    GraphSAGE checkpoint (graphsage_encoder_run*.pt) in one pass, on CPU.
+    - inputs:
+        - **artifacts_dir**: folder with X_all_train.npz (or .pt), edge_index_train.pt,
+                             dims.json and the fitted encoders (*.joblib)
+        - **runs_dir**: folder searched recursively for the checkpoints
+        - **out_dir**: folder where test_item_embeddings_run*.npy are written
+        - **num_threads**: torch intra-op threads (default: all cores)
+        - **isolated**: cold items have no edges in the training graph, so with
+                        mean aggregation their embedding only depends on their
+                        own features. When True only the cold block is encoded;
+                        when False the full sparse graph is propagated.
+    - output: test item embeddings per run, id->row mapping and run metadata,
+              with the same file names the notebook produced
+    """
+    def __init__(self, artifacts_dir='notebooks/graphsage_v2', runs_dir=None, out_dir=None,
+                 data_path='data/', hidden_dim=128, out_dim=64, num_layers=2,
+                 num_threads=None, isolated=True):
+        self.artifacts_dir = artifacts_dir
+        self.runs_dir = runs_dir or os.path.join(artifacts_dir, "runs_graphsage")
+        self.out_dir = out_dir or os.path.join(artifacts_dir, "test_embeddings_runs")
+        self.data_path = data_path
+        self.hidden_dim = hidden_dim
+        self.out_dim = out_dim
+        self.num_layers = num_layers
+        self.isolated = isolated
+        torch.set_num_threads(num_threads or os.cpu_count())
+        with open(os.path.join(artifacts_dir, "dims.json"), "r", encoding="utf-8") as f:
+            self.dims = json.load(f)
+
+    def checkpoint_paths(self):
+        """
+        Returns the checkpoints sorted by run number.
+        """
+        paths = glob.glob(os.path.join(self.runs_dir, "**", "graphsage_encoder_run*.pt"),
+                          recursive=True)
+        if not paths:
+            raise RuntimeError(f"No GraphSAGE checkpoint found in {self.runs_dir}")
+        return sorted(paths, key=lambda p: (self._run_number(p) or 0, p))
+
+    @staticmethod
+    def _run_number(path):
+        match = re.search(r"run(\d+)", os.path.basename(path))
+        return int(match.group(1)) if match else None
+
+    def cold_item_features(self, item_ids):
+        """
+        Builds the feature rows of the cold items in one batch with the
+        encoders fitted on the training items: [zeros(D_user), release
+        one-hot, genres multi-hot], as a CSR matrix. Unseen categories
+        map to zeros.
+        """
+        features = SparseFeatureHandler(self.data_path, self.artifacts_dir)
+        if not features.load_encoders():
+            raise RuntimeError(f"Fitted encoders not found in {self.artifacts_dir}")
+        item_part = features.item_features(item_ids)
+        D_user = int(self.dims["D_user"])
+        D_item = int(self.dims["D_item"])
+        item_part.resize((item_part.shape[0], D_item))
+        return sparse.hstack([sparse.csr_matrix((item_part.shape[0], D_user), dtype=np.float32),
+                              item_part], format="csr")
+
+    def training_features(self):
+        """
+        Training node features (users then items) as a CSR matrix, from
+        X_all_train.npz or, for older artifacts, the dense X_all_train.pt.
+        """
+        npz_path = os.path.join(self.artifacts_dir, "X_all_train.npz")
+        if os.path.exists(npz_path):
+            return sparse.load_npz(npz_path).tocsr()
+        X_train = torch.load(os.path.join(self.artifacts_dir, "X_all_train.pt"), mmap=True)
+        return sparse.csr_matrix(X_train.float().numpy())
+
+    def _sparse_adjacency(self, num_nodes):
+        """
+        Transposed adjacency of the training graph as a torch CSR tensor,
+        built once and shared by every checkpoint.
+        """
+        edge_index = torch.load(os.path.join(self.artifacts_dir, "edge_index_train.pt"))
+        values = torch.ones(edge_index.shape[1], dtype=torch.float32)
+        adj_t = torch.sparse_coo_tensor(
+            edge_index[[1, 0]], values, (num_nodes, num_nodes)).coalesce()
+        return adj_t.to_sparse_csr()
+
+    def _inputs(self, X_cold):
+        """
+        Returns the node features and sparse adjacency to propagate,
+        plus the row where the cold items start.
+        """
+        if self.isolated:
+            n_cold = X_cold.shape[0]
+            empty = torch.sparse_coo_tensor(
+                torch.zeros((2, 0), dtype=torch.long), torch.zeros(0),
+                (n_cold, n_cold)).to_sparse_csr()
+            return SparseFeatureHandler.to_torch(X_cold), empty, 0
+        X_train = self.training_features()
+        X_all = sparse.vstack([X_train, X_cold], format="csr")
+        return SparseFeatureHandler.to_torch(X_all), self._sparse_adjacency(X_all.shape[0]), X_train.shape[0]
+
+    def embed_cold_items(self, item_ids, save=True):
+        """
+        Encodes all cold items with every checkpoint. Returns
+        {run_number: (n_items, out_dim) array}.
+        """
+        X_cold = self.cold_item_features(item_ids)
+        x, adj_t, start = self._inputs(X_cold)
+        encoder = GraphSAGEEncoder(in_dim=x.shape[1], hidden_dim=self.hidden_dim,
+                                   out_dim=self.out_dim, num_layers=self.num_layers)
+        encoder.eval()
+        embeddings = {}
+        runs_info = []
+        for idx, path in enumerate(self.checkpoint_paths(), start=1):
+            run_num = self._run_number(path) or idx
+            encoder.load_state_dict(torch.load(path, map_location="cpu"))
+            with torch.inference_mode():
+                emb = encoder(x, adj_t)[start:start + len(item_ids)].numpy()
+            embeddings[run_num] = emb
+            if save:
+                runs_info.append(self._save_run(run_num, idx, path, emb))
+        if save:
+            self._save_summary(item_ids, runs_info)
+        return embeddings
+
+    def _save_run(self, run_num, idx, path, emb):
+        os.makedirs(self.out_dir, exist_ok=True)
+        emb_path = os.path.join(self.out_dir, f"test_item_embeddings_run{run_num}.npy")
+        np.save(emb_path, emb)
+        run_meta = {
+            "run_index_in_list": idx,
+            "run_number_extracted": run_num,
+            "state_path": path,
+            "embeddings_path": emb_path,
+            "n_test_items": int(emb.shape[0]),
+            "timestamp_utc": datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        }
+        with open(os.path.join(self.out_dir, f"run{run_num}_meta.json"), "w", encoding="utf-8") as f:
+            json.dump(run_meta, f, indent=2, ensure_ascii=False)
+        return run_meta
+
+    def _save_summary(self, item_ids, runs_info):
+        mapping = {str(item_id): i for i, item_id in enumerate(item_ids)}
+        with open(os.path.join(self.out_dir, "test_item_id2idx.json"), "w", encoding="utf-8") as f:
+            json.dump(mapping, f, indent=2, ensure_ascii=False)
+        ts = datetime.now().strftime('%Y%m%dT%H%M%SZ')
+        agg_path = os.path.join(self.out_dir, f"all_runs_test_embeddings_summary_{ts}.json")
+        with open(agg_path, "w", encoding="utf-8") as f:
+            json.dump({"n_states": len(runs_info), "runs": runs_info}, f, indent=2, ensure_ascii=False)
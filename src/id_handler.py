@@ -0,0 +1,159 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Dictionaries already loaded in this process, by path (see get_id_dictionary)
+_dictionaries = {}
+# Guards _dictionaries and every dictionary growth (encode with add=True)
+_lock = threading.RLock()
+
+class IdDictionary:
+    """
+    Central dictionary of the external userId/movieId values (MovieLens
+    integers, stored as strings in the graph) and dense int32 indices.
+    Ids are encoded once when they leave Neo4j or a csv file; the user
+    and item arrays, the ground truth index and the retrieval results
+    then hold indices, and joins become array indexing. External ids
+    are only restored (decode) for reports and printed results.
+    - inputs:
+        - **user_ids**: external user ids, in index order
+        - **movie_ids**: external movie ids, in index order
+        - **path**: .npz file the dictionary is saved to
+    - unknown ids encode to -1 (the empty position of top-k matrices);
+      with add=True they are appended, so existing indices never change,
+      and the dictionary is saved at once. Ids appended by another
+      process and already saved are adopted first, so processes started
+      one after the other agree on the indices.
+    """
+    KINDS = ("user", "movie")
+
+    def __init__(self, user_ids, movie_ids, path='data/id_dictionary.npz'):
+        self.path = path
+        self.keys = {}
+        self._order = {}
+        for kind, ids in zip(self.KINDS, (user_ids, movie_ids)):
+            self._set_keys(kind, np.asarray(ids).astype(np.int64))
+
+    @classmethod
+    def build(cls, data_path='data/', path=None):
+        """
+        Builds the dictionary from userNode.csv and movieNode.csv
+        (indices follow the sorted ids) and saves it.
+        """
+        users = pd.read_csv(data_path + 'userNode.csv', dtype={'userId': 'int64'})
+        movies = pd.read_csv(data_path + 'movieNode.csv', dtype={'movieId': 'int64'})
+        dictionary = cls(np.unique(users["userId"].to_numpy()),
+                         np.unique(movies["movieId"].to_numpy()),
+                         path or os.path.join(data_path, 'id_dictionary.npz'))
+        dictionary.save()
+        return dictionary
+
+    @classmethod
+    def load(cls, path='data/id_dictionary.npz'):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["user_ids"], data["movie_ids"], path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, user_ids=self.keys["user"], movie_ids=self.keys["movie"])
+        os.replace(tmp_path, self.path)
+
+    def _adopt_saved_keys(self):
+        """
+        Takes the ids saved by another process when they extend the
+        ones in memory (same indices, more ids).
+        """
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            saved = {"user": data["user_ids"], "movie": data["movie_ids"]}
+        for kind in self.KINDS:
+            keys = self.keys[kind]
+            if len(saved[kind]) > len(keys) and np.array_equal(saved[kind][:len(keys)], keys):
+                self._set_keys(kind, saved[kind].astype(np.int64))
+
+    def _set_keys(self, kind, keys):
+        if len(np.unique(keys)) != len(keys):
+            raise ValueError(f"Duplicated {kind} ids in the dictionary")
+        self.keys[kind] = keys
+        order = np.argsort(keys, kind="stable")
+        self._order[kind] = (keys[order], order.astype(np.int32))
+
+    def _check_kind(self, kind):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unsupported id kind: {kind}")
+
+    @property
+    def n_users(self):
+        return len(self.keys["user"])
+
+    @property
+    def n_movies(self):
+        return len(self.keys["movie"])
+
+    def encode(self, kind, ids, add=False):
+        """
+        int32 indices of external ids (ints or numeric strings, any
+        array-like), vectorized with a binary search over the sorted keys.
+        """
+        self._check_kind(kind)
+        ids = np.asarray(ids)
+        if ids.dtype.kind not in "iu":
+            ids = ids.astype(np.int64)
+        sorted_keys, order = self._order[kind]
+        if len(sorted_keys) == 0:
+            found = np.zeros(ids.shape, dtype=bool)
+            indices = np.full(ids.shape, -1, dtype=np.int32)
+        else:
+            pos = np.minimum(np.searchsorted(sorted_keys, ids), len(sorted_keys) - 1)
+            found = sorted_keys[pos] == ids
+            indices = np.where(found, order[pos], -1).astype(np.int32)
+        if add and not found.all():
+            with _lock:
+                self._adopt_saved_keys()
+                # other threads may have added some of them meanwhile
+                missing = self.encode(kind, ids) < 0
+                if missing.any():
+                    new_ids = np.unique(ids[missing])
+                    self._set_keys(kind, np.concatenate([self.keys[kind], new_ids.astype(np.int64)]))
+                    self.save()
+            return self.encode(kind, ids)
+        return indices
+
+    def decode(self, kind, indices):
+        """
+        External ids (int64) of int32 indices; -1 stays -1.
+        """
+        self._check_kind(kind)
+        indices = np.asarray(indices)
+        keys = self.keys[kind]
+        return np.where(indices >= 0, keys[np.maximum(indices, 0)], -1)
+
+    def encode_users(self, ids, add=False):
+        return self.encode("user", ids, add)
+
+    def encode_movies(self, ids, add=False):
+        return self.encode("movie", ids, add)
+
+    def decode_users(self, indices):
+        return self.decode("user", indices)
+
+    def decode_movies(self, indices):
+        return self.decode("movie", indices)
+
+def get_id_dictionary(path='data/id_dictionary.npz', data_path='data/'):
+    """
+    Returns the dictionary of the dataset, loaded once per process
+    (built from the node csv files if it was never saved). Safe to call
+    from several threads.
+    """
+    with _lock:
+        if path not in _dictionaries:
+            if os.path.exists(path):
+                _dictionaries[path] = IdDictionary.load(path)
+            else:
+                _dictionaries[path] = IdDictionary.build(data_path, path)
+        return _dictionaries[path]
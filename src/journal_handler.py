@@ -0,0 +1,181 @@
+import os
+import json
+import pandas as pd
+
+class JournalHandler:
+    """
+    Write-ahead journal for the hyperparameter search. Every sample of
+    Movie nodes removed from the graph is recorded (nodes, attribute
+    relationships and WATCHED relationships) before the deletion runs,
+    and every evaluated (split, item) unit is recorded once its metrics
+    are known. After a crash the journal restores the graph and tells
+    the caller which samples and units can be reused.
+    - inputs:
+        - **path**: JSONL file holding one record per line
+    - records (field "event"):
+        - **run_start** / **run_end**: delimit a run; holds the report timestamp
+        - **hold**: payload of a removed sample for a split ("test", "val:<params>")
+        - **release**: the sample of a split was restored in the graph
+        - **unit**: evaluations of one item for one split
+        - **split_done**: all items of a split were evaluated and reported
+    Reports written between the last unit and split_done are written again
+    on resume; ReportHandler.save_report replaces them instead of appending.
+    """
+    def __init__(self, path='experiments/run_journal.jsonl'):
+        self.path = path
+        self.records = self._load()
+
+    def _load(self):
+        """
+        Reads the journal records. A torn last line (crash during
+        the write) is ignored.
+        """
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+    def _append(self, record):
+        """
+        Appends a record and forces it to disk before returning,
+        so it is durable before the graph is touched.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.records.append(record)
+
+    def _current_run(self):
+        """
+        Returns the records written after the last finished run.
+        """
+        last_end = -1
+        for i, record in enumerate(self.records):
+            if record["event"] == "run_end":
+                last_end = i
+        return self.records[last_end + 1:]
+
+    @staticmethod
+    def split_key(params):
+        """
+        Builds a stable split name for a hyperparameter combination.
+        """
+        return "val:" + json.dumps(params, sort_keys=True)
+
+    def start_run(self, timestamp):
+        """
+        Opens a new run, or resumes the unfinished one. Returns the
+        report timestamp of the run so reports keep going to the same file.
+        """
+        for record in self._current_run():
+            if record["event"] == "run_start":
+                return record["timestamp"]
+        self._append({"event": "run_start", "timestamp": timestamp})
+        return timestamp
+
+    def finish_run(self):
+        self._append({"event": "run_end"})
+
+    def held_ids(self, split):
+        """
+        Returns the movie IDs last held for the split in the
+        current run, or None if the split was never sampled.
+        """
+        ids = None
+        for record in self._current_run():
+            if record["event"] == "hold" and record["split"] == split:
+                ids = [movie["movieId"] for movie in record["movies"]]
+        return ids
+
+    def pending_holds(self):
+        """
+        Returns the hold records that were never released,
+        i.e. samples still missing from the graph.
+        """
+        pending = {}
+        for record in self.records:
+            if record["event"] == "hold":
+                pending[record["split"]] = record
+            elif record["event"] == "release":
+                pending.pop(record["split"], None)
+        return list(pending.values())
+
+    def hold(self, node_handler, split, ids):
+        """
+        Extracts the movies and their relationships, journals them
+        and only then removes them from the graph.
+        """
+        movies_id_name, movie_id_caracteristcs = node_handler.extract_movie_nodes_relations(ids)
+        watched = node_handler.extract_user_movie_rels(ids)
+        self._append({
+            "event": "hold",
+            "split": split,
+            "movies": movies_id_name,
+            "attributes": movie_id_caracteristcs.to_dict("records"),
+            "watched": watched
+        })
+        node_handler.bulk_delete_movies(ids)
+        return movies_id_name, movie_id_caracteristcs
+
+    def release(self, node_handler, split):
+        """
+        Restores the held sample of a split and journals the release.
+        """
+        for record in self.pending_holds():
+            if record["split"] == split:
+                self._restore(node_handler, record)
+        self._append({"event": "release", "split": split})
+
+    def recover(self, node_handler):
+        """
+        Restores every sample that is still missing from the graph.
+        All restore operations MERGE, so a partially restored or
+        partially deleted sample ends up consistent.
+        Returns the list of restored splits.
+        """
+        recovered = []
+        for record in self.pending_holds():
+            self._restore(node_handler, record)
+            self._append({"event": "release", "split": record["split"], "recovered": True})
+            recovered.append(record["split"])
+        return recovered
+
+    def _restore(self, node_handler, record):
+        attributes = pd.DataFrame(record["attributes"]) if record["attributes"] else None
+        node_handler.bulk_restore_movies(record["movies"], attributes, record["watched"])
+
+    def mark_unit_done(self, split, movie_id, evaluations):
+        self._append({
+            "event": "unit",
+            "split": split,
+            "movieId": movie_id,
+            "evaluations": evaluations
+        })
+
+    def completed_units(self, split):
+        """
+        Returns {movieId: evaluations} for the items of the split
+        already evaluated in the current run.
+        """
+        return {
+            record["movieId"]: record["evaluations"]
+            for record in self._current_run()
+            if record["event"] == "unit" and record["split"] == split
+        }
+
+    def mark_split_done(self, split):
+        self._append({"event": "split_done", "split": split})
+
+    def is_split_done(self, split):
+        return any(
+            record["event"] == "split_done" and record["split"] == split
+            for record in self._current_run()
+        )
@@ -3,13 +3,18 @@ import pandas as pd
 import numpy as np
 import json
 import os
+from src.id_handler import get_id_dictionary
 
 class EvaluationHandler:
     """
     Calculate Precision at k and NDCG at k metrics for the
     retrieved users ranking and based on the csv file that
-    was used to build the knowledge graph.
+    was used to build the knowledge graph. Items and users are
+    IdDictionary indices.
     """
+    # Ground truth per csv file: (movie index -> first position, user indices)
+    _watched = {}
+
     def __init__(self, item_users_id_dict, path ='data/watchedRel.csv'):
         self.item_id = item_users_id_dict["item_id"]
         self.user_ids = item_users_id_dict["recommended_users"]
@@ -21,9 +26,29 @@ class EvaluationHandler:
         is a public method to allow store the actual users in a variable
         for enhancing metrics calculation at different values of k.
         """
-        actual_users = pd.read_csv(self.path, dtype={'userId': int, 'movieId': int})
-        return actual_users[
-            actual_users["movieId"]==self.item_id.item()]['userId'].to_numpy()
+        indptr, users = self.watched_index(self.path)
+        movie = int(self.item_id)
+        if not 0 <= movie < len(indptr) - 1:
+            return users[:0]
+        return users[indptr[movie]:indptr[movie + 1]]
+
+    @classmethod
+    def watched_index(cls, path):
+        """
+        Users of every movie grouped by movie index (CSR layout),
+        read and encoded once per process.
+        """
+        if path not in cls._watched:
+            ids = get_id_dictionary()
+            watched = pd.read_csv(path, dtype={'userId': 'int64', 'movieId': 'int64'})
+            movies = ids.encode_movies(watched["movieId"].to_numpy())
+            users = ids.encode_users(watched["userId"].to_numpy())
+            known = (movies >= 0) & (users >= 0)
+            order = np.argsort(movies[known], kind="stable")
+            counts = np.bincount(movies[known], minlength=ids.n_movies)
+            cls._watched[path] = (np.concatenate([[0], np.cumsum(counts)]),
+                                  users[known][order])
+        return cls._watched[path]
 
     def calculate_metrics(self, actual_users, k=100):
         """
@@ -52,7 +77,12 @@ class EvaluationHandler:
         retrieved_array = self.user_ids[:k]
         actual_array = set(actual_users)
         # Create binary relevance array for the retrieved users
-        y_true = [1 if user in actual_array else 0 for user in retrieved_array]
+        # (a repeated user only counts at its first position, as in precision)
+        seen = set()
+        y_true = []
+        for user in retrieved_array:
+            y_true.append(1 if user in actual_array and user not in seen else 0)
+            seen.add(user)
 
         # DCG
         discounts_true = np.log2(np.arange(2, len(y_true) + 2))
@@ -77,6 +107,13 @@ class ReportHandler:
         self.timestamp = timestamp
 
     def save_report(self, hyperparameters:dict, method:str, metrics:dict, exp_id:str):
+        """
+        Saves one experiment entry. Idempotent: an entry with the same
+        experiment_id, retrieval method, hyperparameters and metric names
+        is replaced, so a run resumed from the journal after a crash
+        between the report and split_done does not duplicate entries.
+        The file is replaced atomically.
+        """
         experiment = {
             "experiment_id": exp_id,
             "hyperparams": hyperparameters,
@@ -91,9 +128,22 @@ class ReportHandler:
                 data = json.load(f)
         else:
             data = []
+        key = self._entry_key(experiment)
+        data = [entry for entry in data if self._entry_key(entry) != key]
         data.append(experiment)
-        with open(file_path, "w", encoding="utf-8") as f:
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=4)
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def _entry_key(experiment):
+        return json.dumps([
+            experiment.get("experiment_id"),
+            experiment.get("retrieval_method"),
+            experiment.get("hyperparams"),
+            sorted(experiment.get("metrics", {}))
+        ], sort_keys=True)
     
     def get_best_config(self, metric: str, k=10):
         """
@@ -130,3 +180,140 @@ class ReportHandler:
                 best_exp = exp
 
         return best_exp 
+
+class BatchEvaluationHandler:
+    """
+    Scores the top-k rankings of many items at once, for any method
+    (FastRP, LightFM, GraphSAGE), against a single ground truth index
+    built from the csv file used to build the knowledge graph. Metrics
+    follow exactly the definitions of EvaluationHandler, so every method
+    is evaluated the same way. Items and users are IdDictionary indices;
+    reported item_id values are the external movie ids.
+    - inputs:
+        - **path**: csv with the User_Movie relationships (ground truth)
+        - **cutoffs**: values of k
+        - **decimals**: rounding of the metrics (None keeps full precision)
+    - output: one row per (method, item, k) with precision and ndcg
+    """
+    def __init__(self, path='data/watchedRel.csv', cutoffs=(10, 20, 50), decimals=2):
+        self.cutoffs = cutoffs
+        self.decimals = decimals
+        self.ids = get_id_dictionary()
+        watched = pd.read_csv(path, dtype={'userId': 'int64', 'movieId': 'int64'})
+        movies = self.ids.encode_movies(watched["movieId"].to_numpy()).astype('int64')
+        users = self.ids.encode_users(watched["userId"].to_numpy()).astype('int64')
+        known = (movies >= 0) & (users >= 0)
+        self.stride = self.ids.n_users
+        # Ground truth index: sorted (movie, user) keys and relevant users per movie
+        self.gt_keys = np.unique(movies[known] * self.stride + users[known])
+        movies, counts = np.unique(self.gt_keys // self.stride, return_counts=True)
+        self.gt_movies = movies
+        self.gt_counts = counts
+
+    @classmethod
+    def from_index(cls, gt_keys, gt_movies, gt_counts, stride, cutoffs=(10, 20, 50), decimals=2):
+        """
+        Builds the handler over an existing ground truth index (e.g.
+        arrays in shared memory) without reading the csv file.
+        """
+        handler = cls.__new__(cls)
+        handler.ids = None
+        handler.cutoffs = cutoffs
+        handler.decimals = decimals
+        handler.stride = int(stride)
+        handler.gt_keys = gt_keys
+        handler.gt_movies = gt_movies
+        handler.gt_counts = gt_counts
+        return handler
+
+    def evaluate(self, method, item_ids, topk, index_to_user=None):
+        """
+        Scores a (n_items x K) matrix of ranked users in one vectorized pass.
+        - **item_ids**: movie indices of the rows
+        - **topk**: user indices, or user row indices if index_to_user is given;
+                    negative values mark empty positions
+        - **index_to_user**: array mapping user row indices to user indices
+        A user repeated in a row only counts at its first position.
+        """
+        item_ids = np.asarray(item_ids, dtype='int64')
+        topk = np.asarray(topk, dtype='int64')
+        report_ids = item_ids if self.ids is None else self.ids.decode_movies(item_ids)
+        empty = topk < 0
+        if index_to_user is not None:
+            topk = np.asarray(index_to_user, dtype='int64')[np.where(empty, 0, topk)]
+            empty |= topk < 0
+        empty |= self._repeated(topk)
+        keys = item_ids[:, None] * self.stride + topk
+        hits = np.isin(keys, self.gt_keys) & ~empty
+        pos = np.searchsorted(self.gt_movies, item_ids)
+        found = (pos < len(self.gt_movies)) & (self.gt_movies[np.minimum(pos, len(self.gt_movies) - 1)] == item_ids)
+        n_actual = np.where(found, self.gt_counts[np.minimum(pos, len(self.gt_movies) - 1)], 0)
+
+        discounts = 1.0 / np.log2(np.arange(2, topk.shape[1] + 2))
+        ideal = np.concatenate([[0.0], np.cumsum(discounts)])
+        rows = []
+        for k in self.cutoffs:
+            k_eff = np.minimum(k, n_actual)
+            mask = np.arange(topk.shape[1])[None, :] < k_eff[:, None]
+            rel = hits & mask
+            n_rel = rel.sum(axis=1)
+            dcg = (rel * discounts).sum(axis=1)
+            idcg = ideal[n_rel]
+            precision = np.divide(n_rel, k_eff, out=np.zeros(len(k_eff)), where=k_eff > 0)
+            ndcg = np.divide(dcg, idcg, out=np.zeros(len(idcg)), where=idcg > 0)
+            if self.decimals is not None:
+                precision = precision.round(self.decimals)
+                ndcg = ndcg.round(self.decimals)
+            rows.append(pd.DataFrame({
+                "method": method,
+                "item_id": report_ids,
+                "k": k,
+                "precision": precision,
+                "ndcg": ndcg,
+            }))
+        return pd.concat(rows, ignore_index=True)
+
+    @staticmethod
+    def _repeated(topk):
+        """
+        Mask of the positions whose user already appears earlier in the row.
+        """
+        order = np.argsort(topk, axis=1, kind="stable")
+        ranked = np.take_along_axis(topk, order, axis=1)
+        repeated = np.zeros(topk.shape, dtype=bool)
+        np.put_along_axis(repeated, order[:, 1:], ranked[:, 1:] == ranked[:, :-1], axis=1)
+        return repeated
+
+    def evaluate_parquet(self, method, path, index_to_user=None):
+        """
+        Scores a Parquet file in long format (item_id, rank, user_id) with
+        external ids (user_id holds row indices if index_to_user is given,
+        which then maps them to external user ids).
+        """
+        df = pd.read_parquet(path, columns=["item_id", "rank", "user_id"])
+        wide = df.pivot(index="item_id", columns="rank", values="user_id")
+        topk = wide.sort_index(axis=1).fillna(-1).to_numpy(dtype='int64')
+        item_ids = self.ids.encode_movies(wide.index.to_numpy())
+        if index_to_user is not None:
+            index_to_user = self.ids.encode_users(index_to_user)
+        else:
+            topk = np.where(topk < 0, -1, self.ids.encode_users(np.maximum(topk, 0)))
+        return self.evaluate(method, item_ids, topk, index_to_user)
+
+    def evaluate_all(self, rankings, output_path='experiments/per_item_metrics.parquet'):
+        """
+        Scores several methods and writes one per-item table.
+        - **rankings**: {method: (item_ids, topk)} or {method: (item_ids, topk, index_to_user)}
+                        with IdDictionary indices, or {method: parquet path}
+        """
+        tables = []
+        for method, ranking in rankings.items():
+            if isinstance(ranking, str):
+                tables.append(self.evaluate_parquet(method, ranking))
+            else:
+                tables.append(self.evaluate(method, *ranking))
+        table = pd.concat(tables, ignore_index=True)
+        if output_path is not None:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            table.to_parquet(output_path, index=False)
+        return table
@@ -2,7 +2,12 @@
 # 07/2025
 
 from src.gds_connector import get_gds_connection
+from src.projection_handler import admit_projection, track_projection
+from contextlib import contextmanager
+from collections import defaultdict
+import time
 import pandas as pd
+import yaml
 
 class NodeHandler:
     """
@@ -10,9 +15,20 @@ class NodeHandler:
     projected via Neo4j Graph Data Science. It supports tasks
     like sampling, deletion, and reinsertion of nodes for
     analytical workflows and knowledge graph preparation.
+    If a MovieSampler is given, samples are drawn from its cached
+    degree index instead of aggregating WATCHED in the graph; the
+    movies removed through this handler are excluded from the draws.
+    The bulk_* methods restore or delete whole samples with one chunked
+    statement (CALL {} IN TRANSACTIONS), reading WATCHED edges from an
+    in-memory cache of the csv file loaded on first use.
     """
-    def __init__(self):
+    def __init__(self, sampler=None, watched_path="data/watchedRel.csv", batch_size=1000):
         self.gds = get_gds_connection()
+        self.sampler = sampler
+        self.removed_ids = set()
+        self.watched_path = watched_path
+        self.batch_size = batch_size
+        self._watched_cache = None
 
     def hold_and_remove_movies_sample(self, sample_ratio=0.05):
         ids = self.sampling_movie_nodes(sample_ratio)
@@ -20,11 +36,14 @@ class NodeHandler:
         self.delete_nodes_and_rels(ids)
         return movies_id_name, movie_id_caracteristcs
 
-    def sampling_movie_nodes(self, sample_ratio=0.05):
+    def sampling_movie_nodes(self, sample_ratio=0.05, **strata):
         """
         Randomly samples a fraction of Movie nodes
         with at least 50 user connections and returns a list of their IDs.
+        Stratification arguments are forwarded to the MovieSampler.
         """
+        if self.sampler is not None:
+            return self.sampler.sample(sample_ratio, exclude=self.removed_ids, **strata)
         total = self.gds.run_cypher(
             """
             MATCH (m:Movie)-[:WATCHED]-(:User)
@@ -91,6 +110,7 @@ class NodeHandler:
         DETACH DELETE m
         """
         self.gds.run_cypher(query, params={"ids": ids})
+        self.removed_ids.update(ids if isinstance(ids, list) else [ids])
     
     def recreate_movie_nodes(self, movies_id_name):
         """
@@ -103,6 +123,8 @@ class NodeHandler:
         ON CREATE SET m.movieTitle = movie.movieTitle
         """
         self.gds.run_cypher(query, params={"movies": movies_id_name})
+        movies = movies_id_name if isinstance(movies_id_name, list) else [movies_id_name]
+        self.removed_ids.difference_update(movie["movieId"] for movie in movies)
 
     def recreate_movie_attribute_rels(self, df_melted):
         """
@@ -127,16 +149,125 @@ class NodeHandler:
             """
             self.gds.run_cypher(cypher, params={"batch": batch})
     
+    def extract_user_movie_rels(self, ids):
+        """
+        Fetches the WATCHED relationships of the given movie IDs
+        as a list of {userId, movieId} dicts, so they can be
+        restored exactly after the movies are deleted.
+        """
+        cypher = """
+        UNWIND $ids AS movieId
+        MATCH (u:User)-[:WATCHED]->(m:Movie { movieId: movieId })
+        RETURN u.userId AS userId, m.movieId AS movieId
+        """
+        raw = self.gds.run_cypher(cypher, params={"ids": ids})
+        if raw.empty:
+            return []
+        return raw[["userId", "movieId"]].to_dict("records")
+
     def recreate_user_movie_rels(self, movie_ids, csv_path="data/watchedRel.csv"):
         """
-        Reads a CSV of User_Movie links, filters for the given movie IDs,
-        and recreates WATCHED relationships in the Neo4j graph.
+        Filters the User_Movie links of the given movie IDs (from the
+        in-memory edge cache) and recreates WATCHED relationships
+        in the Neo4j graph.
+        """
+        watched = self.watched_edges(csv_path)
+        rels = [{"userId": user_id, "movieId": movie_id}
+                for movie_id in movie_ids for user_id in watched.get(movie_id, [])]
+        self.restore_user_movie_rels(rels)
+
+    def watched_edges(self, csv_path=None):
+        """
+        In-memory cache {movieId: [userId, ...]} of the User_Movie
+        csv file, read once per handler.
+        """
+        csv_path = csv_path or self.watched_path
+        if self._watched_cache is None or self._watched_cache[0] != csv_path:
+            rels = pd.read_csv(csv_path, dtype={'userId': str, 'movieId': str})
+            self._watched_cache = (
+                csv_path, rels.groupby("movieId")["userId"].apply(list).to_dict())
+        return self._watched_cache[1]
+
+    def bulk_restore_movies(self, movies_id_name, df_melted=None, rels=None):
+        """
+        Restores movies, their attribute relationships and their WATCHED
+        relationships with a single parameterized statement, committed
+        in chunks of batch_size movies. Edges come from `rels`
+        ({userId, movieId} dicts, e.g. journaled) or from the edge cache.
+        Everything MERGEs, so it is idempotent. Returns the number of
+        rows sent and the throughput.
+        """
+        movies = movies_id_name if isinstance(movies_id_name, list) else [movies_id_name]
+        if not movies:
+            return {"rows": 0, "seconds": 0.0, "rows_per_second": 0.0}
+        groups, attributes = [], defaultdict(list)
+        if df_melted is not None and not df_melted.empty:
+            for group, ((label, prop, rel), rows) in enumerate(df_melted.groupby(
+                    ["nodeLabel", "attributeType", "relType"], sort=False)):
+                groups.append((label, prop, rel))
+                for movie_id, value in zip(rows["movieId"], rows["attributeValue"]):
+                    attributes[movie_id].append({"group": group, "value": value})
+        if rels is None:
+            watched = self.watched_edges()
+            users = {m["movieId"]: watched.get(m["movieId"], []) for m in movies}
+        else:
+            users = defaultdict(list)
+            for rel in rels:
+                users[rel["movieId"]].append(rel["userId"])
+        batch = [{
+            "movieId": m["movieId"],
+            "movieTitle": m.get("movieTitle"),
+            "attributes": attributes.get(m["movieId"], []),
+            "userIds": users.get(m["movieId"], []),
+        } for m in movies]
+        attribute_merges = "\n            ".join(
+            f"""FOREACH (a IN [x IN row.attributes WHERE x.group = {group}] |
+                MERGE (c:`{label}` {{ {prop}: a.value }})
+                MERGE (m)-[:{rel}]->(c))"""
+            for group, (label, prop, rel) in enumerate(groups))
+        cypher = f"""
+        UNWIND $batch AS row
+        CALL {{
+            WITH row
+            MERGE (m:Movie {{ movieId: row.movieId }})
+            ON CREATE SET m.movieTitle = row.movieTitle
+            {attribute_merges}
+            WITH m, row
+            UNWIND row.userIds AS userId
+            MATCH (u:User {{ userId: userId }})
+            MERGE (u)-[:WATCHED]->(m)
+        }} IN TRANSACTIONS OF $batchSize ROWS
+        """
+        start = time.perf_counter()
+        self.gds.run_cypher(cypher, params={"batch": batch, "batchSize": self.batch_size})
+        seconds = time.perf_counter() - start
+        self.removed_ids.difference_update(m["movieId"] for m in movies)
+        rows = sum(1 + len(b["attributes"]) + len(b["userIds"]) for b in batch)
+        rate = rows / seconds if seconds > 0 else float("inf")
+        print(f"{rows} rows restored in {seconds:.2f}s ({rate:.0f} rows/s).")
+        return {"rows": rows, "seconds": seconds, "rows_per_second": rate}
+
+    def bulk_delete_movies(self, ids):
+        """
+        Detach-deletes movies committed in chunks of batch_size,
+        instead of a single transaction.
+        """
+        ids = ids if isinstance(ids, list) else [ids]
+        self.gds.run_cypher("""
+        UNWIND $ids AS id
+        CALL {
+            WITH id
+            MATCH (m:Movie { movieId: id })
+            DETACH DELETE m
+        } IN TRANSACTIONS OF $batchSize ROWS
+        """, params={"ids": ids, "batchSize": self.batch_size})
+        self.removed_ids.update(ids)
+
+    def restore_user_movie_rels(self, rels):
+        """
+        Recreates WATCHED relationships from a list of
+        {userId, movieId} dicts. MERGE keeps it idempotent.
         """
-        rels = pd.read_csv(csv_path,
-                         dtype={'userId': str, 'movieId': str}
-                         )
-        rels = rels[rels["movieId"].isin(movie_ids)]
-        rels = rels[['userId', 'movieId']].to_dict("records")
         cypher = """
         UNWIND $relations AS rel
         MATCH (u:User  { userId: rel.userId })
@@ -163,7 +294,7 @@ class NodeSubgraphHandler:
         """
         result = self.gds.run_cypher(f"""
         MATCH (n:Movie {{movieId: $movie_id}})
-        WITH id(n) AS targetId
+        WITH n, id(n) AS targetId
         OPTIONAL MATCH (n)-[*1..{self.hops}]-(m)
         WITH collect(DISTINCT id(m)) AS neighborIds, targetId
         WITH [targetId] + neighborIds AS allIds
@@ -186,10 +317,161 @@ class NodeSubgraphHandler:
 
         # Projection of the Sub Graph
         self.gds.graph.drop('subgraph_projection', False)
+        admit_projection(node_spec, relationship_spec, cypher=True,
+                         parameters={"nodeIds": node_ids})
         projection, metadata = self.gds.graph.project.cypher(
             "subgraph_projection",
             node_spec,
             relationship_spec,
             parameters={"nodeIds": node_ids}
         )
-        return projection
+        return track_projection(projection)
+
+class FilteredSubgraphHandler:
+    """
+    Neo4j-backend alternative to NodeSubgraphHandler. Instead of one
+    Cypher projection per item, the held-out movies are restored once
+    with their attribute relationships (no WATCHED) and each item
+    subgraph is derived with GDS filtered projection (gds.graph.filter)
+    from a native projection shared by a batch of items. The subgraph
+    holds the same nodes as NodeSubgraphHandler: the movie and the nodes
+    within `hops` of it, reached without going through the other
+    held-out movies. Those neighbourhoods are found by BFS in the graph
+    and tagged on the nodes (one subgraphTag<k> property per item of the
+    batch) before the batch projection is created.
+    Used as a context manager: on exit the tags and projections are
+    removed and the movies deleted again.
+    - inputs:
+        - **node_handler**: NodeHandler of the current run
+        - **movies_id_name**: held-out movies (as returned by extract_movie_nodes_relations)
+        - **movie_id_caracteristcs**: their attribute relationships
+        - **hops**: neighbourhood radius (same as NodeSubgraphHandler)
+        - **batch_size**: items sharing one base projection
+    """
+    def __init__(self, node_handler, movies_id_name, movie_id_caracteristcs, hops=2,
+                 batch_size=32, config_path="src/config.yaml", graph_name='heldout_base_projection'):
+        self.gds = node_handler.gds
+        self.node_handler = node_handler
+        self.movies_id_name = movies_id_name
+        self.movie_id_caracteristcs = movie_id_caracteristcs
+        self.movie_ids = [movie["movieId"] for movie in movies_id_name]
+        self.hops = hops
+        self.batch_size = batch_size
+        self.config_path = config_path
+        self.graph_name = graph_name
+        self.base_projection = None
+        self.batch = None
+        self.tags = {}
+
+    def __enter__(self):
+        self.node_handler.recreate_movie_nodes(self.movies_id_name)
+        self.node_handler.recreate_movie_attribute_rels(self.movie_id_caracteristcs)
+        # numeric marker of the held-out movies, excluded from the BFS
+        self.gds.run_cypher("""
+        UNWIND $ids AS id
+        MATCH (m:Movie { movieId: id })
+        SET m.heldOutId = toInteger(m.movieId)
+        """, params={"ids": self.movie_ids})
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.gds.graph.drop(self.graph_name, False)
+        self.clear_tags()
+        self.node_handler.delete_nodes_and_rels(self.movie_ids)
+        return False
+
+    def neighbourhood_ids(self, movie_id):
+        """
+        Internal ids of the movie and of the nodes within `hops` of it,
+        by BFS over every relationship, not entering other held-out movies.
+        """
+        target = self.gds.run_cypher("""
+        MATCH (m:Movie { movieId: $movieId })
+        RETURN id(m) AS id
+        """, params={"movieId": movie_id})
+        if target.empty:
+            raise ValueError(f"Movie {movie_id} is not in the graph")
+        seen = {int(target["id"].iloc[0])}
+        frontier = list(seen)
+        for _ in range(self.hops):
+            if not frontier:
+                break
+            result = self.gds.run_cypher("""
+            UNWIND $frontier AS id
+            MATCH (n)--(m)
+            WHERE id(n) = id AND coalesce(m.heldOutId, 0) = 0
+            RETURN DISTINCT id(m) AS id
+            """, params={"frontier": frontier})
+            frontier = [int(i) for i in result["id"] if int(i) not in seen]
+            seen.update(frontier)
+        return sorted(seen)
+
+    def clear_tags(self):
+        for k, node_ids in self.tags.items():
+            self.gds.run_cypher(f"""
+            UNWIND $ids AS id
+            MATCH (n) WHERE id(n) = id
+            REMOVE n.subgraphTag{k}
+            """, params={"ids": node_ids})
+        self.tags = {}
+
+    def prepare_batch(self, batch):
+        """
+        Tags the neighbourhood of every movie of the batch and projects
+        the graph with those tags (the previous batch is cleared).
+        """
+        self.gds.graph.drop(self.graph_name, False)
+        self.clear_tags()
+        for k, movie_id in enumerate(self.movie_ids[batch * self.batch_size:
+                                                    (batch + 1) * self.batch_size]):
+            node_ids = self.neighbourhood_ids(movie_id)
+            self.gds.run_cypher(f"""
+            UNWIND $ids AS id
+            MATCH (n) WHERE id(n) = id
+            SET n.subgraphTag{k} = 1
+            """, params={"ids": node_ids})
+            self.tags[k] = node_ids
+        self.base_projection = self.project_base_graph()
+        self.batch = batch
+
+    def project_base_graph(self):
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+        properties = {f"subgraphTag{k}": {"property": f"subgraphTag{k}", "defaultValue": 0}
+                      for k in self.tags}
+        node_projection = {
+            name: {**spec, "properties": properties}
+            for name, spec in cfg.get("node_projection").items()
+        }
+        self.gds.graph.drop(self.graph_name, False)
+        admit_projection(node_projection, cfg.get("relationship_projection"))
+        projection, metadata = self.gds.graph.project(
+            self.graph_name,
+            node_projection,
+            cfg.get("relationship_projection")
+        )
+        return track_projection(projection)
+
+    @contextmanager
+    def item_subgraph_projection(self, movie_id):
+        """
+        Yields the subgraph of a single held-out movie (its `hops`
+        neighbourhood, as NodeSubgraphHandler) and drops it afterwards.
+        """
+        position = self.movie_ids.index(movie_id)
+        batch, k = divmod(position, self.batch_size)
+        if batch != self.batch:
+            self.prepare_batch(batch)
+        graph_name = f"subgraph_projection_{movie_id}"
+        self.gds.graph.drop(graph_name, False)
+        projection, metadata = self.gds.graph.filter(
+            graph_name,
+            self.base_projection,
+            f"n.subgraphTag{k} = 1",
+            "*"
+        )
+        track_projection(projection)
+        try:
+            yield projection
+        finally:
+            self.gds.graph.drop(graph_name, False)
@@ -0,0 +1,202 @@
+import os
+import sys
+import threading
+import queue
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from src.vector_search_handler import VectorRetriever
+from src.metrics_handler import BatchEvaluationHandler
+
+# Arrays attached by each worker process (see _attach_worker)
+_worker = {}
+
+def _attach(spec):
+    """
+    Maps a shared memory block described by (name, shape, dtype)
+    to a numpy array without copying it.
+    """
+    name, shape, dtype = spec
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+def _attach_worker(specs, stride, length, cutoffs):
+    blocks = {key: _attach(spec) for key, spec in specs.items()}
+    arrays = {key: array for key, (shm, array) in blocks.items()}
+    _worker["blocks"] = blocks
+    _worker["users_array"] = [arrays["user_ids"], arrays["user_vectors"]]
+    _worker["length"] = length
+    _worker["evaluator"] = BatchEvaluationHandler.from_index(
+        arrays["gt_keys"], arrays["gt_movies"], arrays["gt_counts"], stride, cutoffs)
+
+def _evaluate_shard(item_ids, vectors, methods):
+    """
+    Retrieves and scores one shard of items in a worker. Returns one
+    list of evaluations per item, in the shard order, with the same
+    records (method, cutoff, precision, ndcg) main.py builds.
+    """
+    users_array = _worker["users_array"]
+    evaluator = _worker["evaluator"]
+    results = [[] for _ in item_ids]
+    for method in methods:
+        topk = np.stack([
+            VectorRetriever([np.array(item_id), vector], users_array,
+                            method=method, length=_worker["length"]
+                            ).retrieve_users()["recommended_users"]
+            for item_id, vector in zip(item_ids, vectors)
+        ])
+        metrics = evaluator.evaluate(method, item_ids, topk)
+        for k in evaluator.cutoffs:
+            rows = metrics[metrics["k"] == k]
+            for i, (precision, ndcg) in enumerate(zip(rows["precision"], rows["ndcg"])):
+                results[i].append({
+                    "cutoff": k,
+                    "precision": float(precision),
+                    "ndcg": float(ndcg),
+                    "method": method,
+                })
+    # same order as the serial loop: method, then cutoff
+    return results
+
+class ShardedEvaluationExecutor:
+    """
+    Evaluates held-out items on every core once the user embeddings
+    exist. The user matrix and the ground truth index are placed in
+    shared memory once and attached (not copied) by each worker
+    process; items are sent in shards through a process pool and the
+    per-item results come back in the input order.
+    Use as a context manager, so the shared memory is always released.
+    - inputs:
+        - **users_array**: [user indices, embeddings]
+        - **length**: number of users retrieved per item
+        - **cutoffs**: values of k for Precision@k and NDCG@k
+        - **path**: csv with the User_Movie relationships (ground truth)
+        - **n_workers**: number of processes (default: all cores)
+        - **shard_size**: number of items per task
+    """
+    def __init__(self, users_array, length=50, cutoffs=(10, 20, 50),
+                 path='data/watchedRel.csv', n_workers=None, shard_size=8):
+        self.users_array = users_array
+        self.length = length
+        self.cutoffs = cutoffs
+        self.path = path
+        self.n_workers = n_workers or os.cpu_count()
+        self.shard_size = shard_size
+        self.blocks = []
+        self.pool = None
+
+    def __enter__(self):
+        ground_truth = BatchEvaluationHandler(self.path, self.cutoffs)
+        specs = {
+            "user_ids": self._share(np.asarray(self.users_array[0], dtype=np.int32)),
+            "user_vectors": self._share(np.asarray(self.users_array[1])),
+            "gt_keys": self._share(ground_truth.gt_keys),
+            "gt_movies": self._share(ground_truth.gt_movies),
+            "gt_counts": self._share(ground_truth.gt_counts),
+        }
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.n_workers, initializer=_attach_worker,
+            initargs=(specs, ground_truth.stride, self.length, self.cutoffs))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=exc_type is not None)
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+        return False
+
+    def _share(self, array):
+        """
+        Copies an array into a new shared memory block and
+        returns the (name, shape, dtype) used to attach it.
+        """
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+        self.blocks.append(shm)
+        return shm.name, array.shape, array.dtype.str
+
+    def evaluate(self, item_arrays, methods):
+        """
+        Scores a list of item arrays ([item id, vector], as returned by
+        ItemEmbeddingHandler) with every method. Returns one list of
+        evaluations per item, in the input order.
+        """
+        if self.pool is None:
+            raise RuntimeError("ShardedEvaluationExecutor must be used as a context manager")
+        if not item_arrays:
+            return []
+        item_ids = np.array([np.asarray(a[0]).item() for a in item_arrays], dtype=np.int32)
+        vectors = np.stack([np.asarray(a[1]) for a in item_arrays])
+        futures = [
+            self.pool.submit(_evaluate_shard, item_ids[start:start + self.shard_size],
+                             vectors[start:start + self.shard_size], list(methods))
+            for start in range(0, len(item_ids), self.shard_size)
+        ]
+        return [result for future in futures for result in future.result()]
+
+class PipelinedItemExecutor:
+    """
+    Overlaps the Neo4j work of the next held-out items (recreate,
+    projection, FastRP, delete) with the scoring of the current one.
+    A single background thread prepares the items strictly one after
+    the other, so only one held-out movie is ever back in the graph
+    (same isolation as the serial loop), and a bounded queue stops it
+    when it is max_prefetch items ahead of the consumer (backpressure).
+    Iterating yields (item, prepared value) in the input order.
+    - inputs:
+        - **items**: items to prepare (e.g. held-out movie dicts)
+        - **prepare**: function called with each item in the background thread
+        - **max_prefetch**: number of prepared items waiting to be consumed
+    """
+    _DONE = object()
+
+    def __init__(self, items, prepare, max_prefetch=2):
+        self.items = items
+        self.prepare = prepare
+        self.max_prefetch = max(1, max_prefetch)
+
+    def __iter__(self):
+        prepared = queue.Queue(maxsize=self.max_prefetch)
+        stop = threading.Event()
+
+        def put(entry):
+            # blocks while the queue is full, unless the consumer stopped
+            while not stop.is_set():
+                try:
+                    prepared.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer():
+            try:
+                for item in self.items:
+                    if stop.is_set() or not put((item, self.prepare(item), None)):
+                        return
+            except Exception as e:
+                put((None, None, e))
+            finally:
+                put((self._DONE, None, None))
+
+        thread = threading.Thread(target=producer, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item, value, error = prepared.get()
+                if error is not None:
+                    raise error
+                if item is self._DONE:
+                    break
+                yield item, value
+        finally:
+            # waits for the item in progress, so the graph is left consistent
+            stop.set()
+            thread.join()
@@ -0,0 +1,146 @@
+import threading
+from src.gds_connector import get_gds_connection
+
+# Registries currently open (innermost last), see track_projection
+_active = []
+_lock = threading.Lock()
+
+def _innermost():
+    with _lock:
+        return _active[-1] if _active else None
+
+def admit_projection(node_spec, relationship_spec, cypher=False, **config):
+    """
+    Checks a projection about to be created against the heap budget
+    of the innermost open ProjectionRegistry, if any (see admit).
+    Called by every handler right before gds.graph.project or
+    gds.graph.project.cypher, with the same arguments.
+    """
+    registry = _innermost()
+    if registry is not None:
+        registry.admit(node_spec, relationship_spec, cypher, **config)
+
+def track_projection(projection):
+    """
+    Registers a projection just created in the innermost open
+    ProjectionRegistry, if any. Called by every handler that
+    creates GDS projections.
+    """
+    registry = _innermost()
+    if registry is not None:
+        registry.register(projection)
+    return projection
+
+class ProjectionRegistry:
+    """
+    Lifecycle of the GDS projections created during a run. Every
+    projection created while the registry is open (see track_projection)
+    is recorded with its node/relationship counts and memory from the
+    catalog, and dropped when the registry closes, also on failure.
+    With a heap budget, a native or Cypher projection is estimated
+    before it is created (see admit_projection) and refused if the
+    estimate takes the catalog of the current user above the budget.
+    Once created, every projection (filtered ones included, which have
+    no estimate) is checked again with its actual size and dropped at
+    once if the catalog is over the budget.
+    - inputs:
+        - **heap_budget_mb**: maximum memory of the GDS catalog (None: no limit)
+    Used as a context manager, or with open() / close().
+    """
+    def __init__(self, heap_budget_mb=None):
+        self.gds = None
+        self.heap_budget = heap_budget_mb * 1024 ** 2 if heap_budget_mb else None
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def open(self):
+        self.gds = get_gds_connection()
+        with _lock:
+            _active.append(self)
+        return self
+
+    def close(self):
+        """
+        Drops every projection created while open and returns the report.
+        """
+        with _lock:
+            if self in _active:
+                _active.remove(self)
+        if self.gds is None:
+            return []
+        with self._lock:
+            names = list(self.records)
+        for name in names:
+            self.gds.graph.drop(name, False)
+        report = self.report()
+        if report:
+            peak = max(r["sizeInBytes"] for r in report)
+            print(f"{len(report)} projection(s) dropped, largest {peak / 1024 ** 2:.1f} MB.")
+        return report
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def catalog(self, graph_name=None):
+        """
+        Name, counts and memory of the projections in the GDS catalog.
+        """
+        columns = ["graphName", "nodeCount", "relationshipCount", "memoryUsage", "sizeInBytes"]
+        listing = self.gds.graph.list(graph_name) if graph_name else self.gds.graph.list()
+        return listing[columns]
+
+    def admit(self, node_spec, relationship_spec, cypher=False, **config):
+        """
+        Refuses a projection before it is created when its estimated
+        memory (bytesMax of gds.graph.project.estimate, or of
+        gds.graph.project.cypher.estimate) plus the current catalog
+        exceeds the heap budget.
+        """
+        if self.heap_budget is None:
+            return
+        runner = self.gds.graph.project.cypher if cypher else self.gds.graph.project
+        estimate = runner.estimate(node_spec, relationship_spec, **config)
+        required = int(estimate["bytesMax"])
+        used = int(self.catalog()["sizeInBytes"].sum())
+        if used + required > self.heap_budget:
+            raise RuntimeError(
+                f"Projection estimated at {estimate['requiredMemory']} would take the GDS "
+                f"catalog to {(used + required) / 1024 ** 2:.1f} MB, above the budget of "
+                f"{self.heap_budget / 1024 ** 2:.1f} MB")
+
+    def register(self, projection):
+        """
+        Records a new projection and enforces the heap budget on its
+        actual size (backstop of admit, which works on estimates).
+        """
+        name = projection.name()
+        row = self.catalog(name)
+        record = row.iloc[0].to_dict() if not row.empty else {
+            "graphName": name, "nodeCount": 0, "relationshipCount": 0,
+            "memoryUsage": "", "sizeInBytes": 0}
+        record["sizeInBytes"] = int(record["sizeInBytes"])
+        with self._lock:
+            self.records[name] = record
+        if self.heap_budget is not None:
+            used = int(self.catalog()["sizeInBytes"].sum())
+            if used > self.heap_budget:
+                self.gds.graph.drop(name, False)
+                with self._lock:
+                    self.records.pop(name, None)
+                raise RuntimeError(
+                    f"Projection {name} ({record['memoryUsage']}) takes the GDS catalog to "
+                    f"{used / 1024 ** 2:.1f} MB, above the budget of "
+                    f"{self.heap_budget / 1024 ** 2:.1f} MB")
+
+    def report(self):
+        """
+        One record per projection created while open (last creation
+        of each name): graphName, nodeCount, relationshipCount,
+        memoryUsage and sizeInBytes at creation time.
+        """
+        with self._lock:
+            return [dict(record) for record in self.records.values()]
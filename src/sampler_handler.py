@@ -0,0 +1,114 @@
+import os
+import numpy as np
+import pandas as pd
+
+class MovieSampler:
+    """
+    In-memory sampler of Movie nodes for the Test/Validation splits.
+    It replaces the two full WATCHED aggregations that run in Neo4j
+    for every sample by a degree index built once from the csv files
+    that were used to build the knowledge graph, and cached on disk.
+    - inputs:
+        - **index_path**: csv cache of the index (movieId, userCount, releaseYear)
+        - **min_users**: minimum number of WATCHED relationships of an eligible movie
+        - **seed**: seed of the random generator, so the sequence of samples
+                    (test set, then one validation set per combination) is reproducible
+    """
+    def __init__(self, index_path='data/movieDegreeIndex.csv', min_users=50, seed=42,
+                 watched_path='data/watchedRel.csv', release_path='data/releaseRel.csv'):
+        self.index_path = index_path
+        self.min_users = min_users
+        self.watched_path = watched_path
+        self.release_path = release_path
+        self.rng = np.random.default_rng(seed)
+        index = self.load_degree_index()
+        self.population = index[index["userCount"] >= min_users].reset_index(drop=True)
+
+    def load_degree_index(self):
+        """
+        Loads the cached degree index, building it on the first call.
+        """
+        if os.path.exists(self.index_path):
+            return pd.read_csv(self.index_path, dtype={'movieId': str})
+        return self.build_degree_index()
+
+    def build_degree_index(self):
+        """
+        Counts the WATCHED relationships per movie (same count(*) used
+        by the Cypher sampling) and attaches the release year.
+        """
+        watched = pd.read_csv(self.watched_path, dtype={'userId': str, 'movieId': str})
+        release = pd.read_csv(self.release_path, dtype={'movieId': str, 'releaseDate': str})
+        index = watched.groupby("movieId").size().rename("userCount").reset_index()
+        release["releaseYear"] = pd.to_numeric(
+            release["releaseDate"].str[-4:], errors="coerce")
+        index = index.merge(
+            release[["movieId", "releaseYear"]].drop_duplicates("movieId"),
+            how="left", on="movieId")
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        index.to_csv(self.index_path, index=False)
+        return index
+
+    def sample(self, sample_ratio=0.05, exclude=(), stratify=None,
+               popularity_bins=4, release_years=None):
+        """
+        Draws round(N * sample_ratio) eligible movies, N being the eligible
+        movies not in `exclude` (movies currently removed from the graph).
+        - **stratify**: None, "popularity", "release_year" or a list of both.
+                        Each stratum contributes proportionally to its size.
+        - **popularity_bins**: number of quantile buckets of userCount
+        - **release_years**: optional list of years to restrict the population
+        Returns a list of movieIds (str), as stored in the graph.
+        """
+        candidates = self.population
+        if release_years is not None:
+            candidates = candidates[candidates["releaseYear"].isin(release_years)]
+        if len(exclude):
+            candidates = candidates[~candidates["movieId"].isin(list(exclude))]
+        candidates = candidates.reset_index(drop=True)
+        limit = int(round(len(candidates) * sample_ratio))
+        if limit == 0:
+            return []
+        if stratify is None:
+            rows = self.rng.choice(len(candidates), size=limit, replace=False)
+            return candidates["movieId"].iloc[rows].tolist()
+
+        strata = self._strata_keys(candidates, stratify, popularity_bins)
+        groups = candidates.groupby(strata, sort=True).indices
+        sizes = np.array([len(rows) for rows in groups.values()])
+        quotas = self._allocate(sizes, limit)
+        sampled = []
+        for rows, quota in zip(groups.values(), quotas):
+            if quota > 0:
+                sampled.extend(self.rng.choice(rows, size=quota, replace=False))
+        return candidates["movieId"].iloc[sampled].tolist()
+
+    def _strata_keys(self, candidates, stratify, popularity_bins):
+        """
+        Returns the list of Series that define the strata.
+        """
+        if isinstance(stratify, str):
+            stratify = [stratify]
+        keys = []
+        for name in stratify:
+            if name == "popularity":
+                keys.append(pd.qcut(candidates["userCount"], q=popularity_bins,
+                                    labels=False, duplicates="drop").rename("popularity"))
+            elif name == "release_year":
+                keys.append(candidates["releaseYear"].fillna(-1).rename("release_year"))
+            else:
+                raise ValueError(f"Unsupported stratification: {name}")
+        return keys
+
+    @staticmethod
+    def _allocate(sizes, limit):
+        """
+        Proportional allocation of `limit` draws over strata
+        (largest remainder method), capped by each stratum size.
+        """
+        exact = sizes * limit / sizes.sum()
+        quotas = np.floor(exact).astype(int)
+        remainder = limit - quotas.sum()
+        for i in np.argsort(-(exact - quotas))[:remainder]:
+            quotas[i] += 1
+        return np.minimum(quotas, sizes)
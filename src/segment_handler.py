@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from src.id_handler import get_id_dictionary
+
+class UserSegmentIndex:
+    """
+    Bitmap index of the user attributes (Age, Gender, Occupation and
+    Zipcode), built from the csv files used to build the knowledge graph.
+    One packed bitmap per attribute value, aligned with the rows of a
+    user embedding matrix, so a campaign segment resolves to the rows
+    to score with a few bitwise operations.
+    - inputs:
+        - **user_ids**: user indices (IdDictionary) in the row order of the
+                        embedding matrix (users_array[0])
+        - **data_path**: folder with ageRel, genderRel, occupationRel and residesRel
+    - filter expression: terms joined by '&' (AND). A term is attribute=value,
+      values separated by '|' are OR-ed and a leading '!' negates the term,
+      e.g. "gender=F & age=18|25 & !occupation=student". A dict
+      {attribute: value or list of values} is also accepted.
+    """
+    ATTRIBUTES = {
+        "age": "ageRel.csv",
+        "gender": "genderRel.csv",
+        "occupation": "occupationRel.csv",
+        "zipcode": "residesRel.csv",
+    }
+
+    def __init__(self, user_ids, data_path='data/'):
+        self.user_ids = np.asarray(user_ids, dtype=np.int32)
+        self.n_users = len(self.user_ids)
+        self.bitmaps = {}
+        self._rows_cache = {}
+        ids = get_id_dictionary()
+        row_of_user = np.full(ids.n_users, -1, dtype=np.int64)
+        row_of_user[self.user_ids] = np.arange(self.n_users)
+        for attribute, file_name in self.ATTRIBUTES.items():
+            rels = pd.read_csv(data_path + file_name, dtype={'userId': 'int64', attribute: str})
+            users = ids.encode_users(rels["userId"].to_numpy())
+            rows = np.where(users >= 0, row_of_user[np.maximum(users, 0)], -1)
+            known = rows >= 0
+            rows, values = rows[known], rels[attribute].to_numpy()[known]
+            self.bitmaps[attribute] = {}
+            for value in np.unique(values):
+                mask = np.zeros(self.n_users, dtype=bool)
+                mask[rows[values == value]] = True
+                self.bitmaps[attribute][value] = np.packbits(mask)
+
+    def _empty(self):
+        return np.zeros((self.n_users + 7) // 8, dtype=np.uint8)
+
+    def _term_bitmap(self, attribute, values):
+        bitmap = self._empty()
+        for value in values:
+            bitmap |= self.bitmaps[attribute][str(value)]
+        return bitmap
+
+    def _check_term(self, attribute, values):
+        if attribute not in self.bitmaps:
+            raise ValueError(f"Unsupported user attribute: {attribute} "
+                             f"(known: {', '.join(self.bitmaps)})")
+        unknown = [str(v) for v in values if str(v) not in self.bitmaps[attribute]]
+        if unknown:
+            known = sorted(self.bitmaps[attribute])
+            sample = ", ".join(known[:20]) + (", ..." if len(known) > 20 else "")
+            raise ValueError(f"Unknown {attribute} value(s): {', '.join(unknown)} "
+                             f"(known: {sample})")
+
+    def parse(self, expression):
+        """
+        Returns the filter as a list of (attribute, values, negated) terms.
+        Unknown attributes and attribute values raise a ValueError.
+        """
+        if isinstance(expression, dict):
+            terms = [(attribute, list(values) if isinstance(values, (list, tuple, set)) else [values],
+                      False) for attribute, values in expression.items()]
+        else:
+            terms = self._parse_expression(expression)
+        for attribute, values, _ in terms:
+            self._check_term(attribute, values)
+        return terms
+
+    @staticmethod
+    def _parse_expression(expression):
+        terms = []
+        for term in str(expression).split("&"):
+            term = term.strip()
+            negated = term.startswith("!")
+            if "=" not in term:
+                raise ValueError(f"Invalid filter term: {term}")
+            attribute, values = term.lstrip("!").split("=", 1)
+            terms.append((attribute.strip(), [v.strip() for v in values.split("|")], negated))
+        return terms
+
+    def bitmap(self, expression):
+        """
+        Packed bitmap of the users matching the filter expression.
+        """
+        result = np.packbits(np.ones(self.n_users, dtype=bool))
+        for attribute, values, negated in self.parse(expression):
+            term = self._term_bitmap(attribute, values)
+            result &= ~term if negated else term
+        return result
+
+    def rows(self, expression):
+        """
+        Row indices (in the embedding matrix) of the matching users.
+        Cached per expression, since every cold item of a campaign
+        uses the same segment.
+        """
+        key = repr(sorted(self.parse(expression)))
+        if key not in self._rows_cache:
+            mask = np.unpackbits(self.bitmap(expression), count=self.n_users).astype(bool)
+            self._rows_cache[key] = np.flatnonzero(mask)
+        return self._rows_cache[key]
@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import itertools
+import numpy as np
+import pandas as pd
+from scipy.stats import wilcoxon
+
+class PairedStatisticsHandler:
+    """
+    Significance analysis of per-item metrics of any number of methods
+    (replaces the paired comparison of estatisticas_estudo_de_caso.ipynb).
+    Bootstrap intervals and permutation tests draw all resamples as a
+    single (n_resamples x n_items) array operation.
+    - inputs:
+        - **sources**: {method: source}, source being a json file with per-item
+                       lists ("precision_at_10" or "precision@10" keys, items
+                       aligned by position), a Parquet file or DataFrame from
+                       BatchEvaluationHandler (method, item_id, k, precision, ndcg)
+        - **n_resamples**: number of bootstrap resamples and permutations
+        - **confidence**: level of the bootstrap intervals
+        - **seed**: seed of the random generator
+    - output: machine-readable dict (and json file) with one entry per
+              (method, metric, k) and per (pair of methods, metric, k)
+    """
+    KEY_PATTERN = re.compile(r"^(precision|ndcg)(?:_at_|@)(\d+)$")
+
+    def __init__(self, sources, n_resamples=10000, confidence=0.95, seed=42):
+        self.n_resamples = n_resamples
+        self.confidence = confidence
+        self.rng = np.random.default_rng(seed)
+        self.metrics = pd.concat(
+            [self.load_metrics(method, source) for method, source in sources.items()],
+            ignore_index=True)
+
+    def load_metrics(self, method, source):
+        """
+        Returns the per-item metrics of one method in long format
+        (method, item, metric, k, value).
+        """
+        if isinstance(source, pd.DataFrame) or str(source).endswith(".parquet"):
+            df = source if isinstance(source, pd.DataFrame) else pd.read_parquet(source)
+            # tables of BatchEvaluationHandler.evaluate_all hold several methods
+            if "method" in df.columns and (df["method"] == method).any():
+                df = df[df["method"] == method]
+            df = df.melt(id_vars=["item_id", "k"], value_vars=["precision", "ndcg"],
+                         var_name="metric", value_name="value")
+            return pd.DataFrame({
+                "method": method,
+                "item": df["item_id"].astype(str),
+                "metric": df["metric"],
+                "k": df["k"].astype(int),
+                "value": df["value"].astype(float),
+            })
+        with open(source, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        frames = []
+        for key, values in data.items():
+            match = self.KEY_PATTERN.match(key)
+            if match is None:
+                continue
+            frames.append(pd.DataFrame({
+                "method": method,
+                "item": [str(i) for i in range(len(values))],
+                "metric": match.group(1),
+                "k": int(match.group(2)),
+                "value": np.asarray(values, dtype=float),
+            }))
+        if not frames:
+            raise ValueError(f"No per-item metrics found in {source}")
+        return pd.concat(frames, ignore_index=True)
+
+    def bootstrap_ci(self, values):
+        """
+        Percentile bootstrap interval of the mean for each row of
+        a (n_methods x n_items) matrix, same resamples for all rows.
+        """
+        n = values.shape[1]
+        idx = self.rng.integers(0, n, size=(self.n_resamples, n))
+        means = np.stack([row[idx].mean(axis=1) for row in values])
+        alpha = (1 - self.confidence) / 2
+        low, high = np.quantile(means, [alpha, 1 - alpha], axis=1)
+        return low, high
+
+    def permutation_test(self, a, b):
+        """
+        Two-sided paired permutation test of the mean difference
+        (random sign flips of the per-item differences).
+        """
+        diffs = a - b
+        observed = abs(diffs.mean())
+        signs = self.rng.choice(np.array([-1.0, 1.0]), size=(self.n_resamples, len(diffs)))
+        permuted = np.abs((signs * diffs).mean(axis=1))
+        return float((np.count_nonzero(permuted >= observed - 1e-12) + 1) / (self.n_resamples + 1))
+
+    @staticmethod
+    def wilcoxon_test(a, b):
+        """
+        Wilcoxon signed-rank test; identical samples give p-value 1.
+        """
+        if np.allclose(a, b):
+            return None, 1.0
+        result = wilcoxon(a, b)
+        return float(result.statistic), float(result.pvalue)
+
+    def run(self, output_path='experiments/statistics.json'):
+        """
+        Computes the bootstrap intervals of every method and the paired
+        tests of every pair of methods, for every metric and k.
+        """
+        summary = {"n_resamples": self.n_resamples, "confidence": self.confidence,
+                   "bootstrap": [], "paired_tests": []}
+        for (metric, k), group in self.metrics.groupby(["metric", "k"], sort=True):
+            wide = group.pivot_table(index="item", columns="method", values="value")
+            n_all = len(wide)
+            wide = wide.dropna()
+            if len(wide) < n_all:
+                print(f"{metric}@{k}: {n_all - len(wide)} items missing in some method, dropped.")
+            methods = list(wide.columns)
+            values = wide.to_numpy().T
+            low, high = self.bootstrap_ci(values)
+            for i, method in enumerate(methods):
+                summary["bootstrap"].append({
+                    "method": method, "metric": metric, "k": int(k),
+                    "n_items": int(values.shape[1]),
+                    "mean": float(values[i].mean()),
+                    "ci_low": float(low[i]), "ci_high": float(high[i]),
+                })
+            for i, j in itertools.combinations(range(len(methods)), 2):
+                statistic, wilcoxon_p = self.wilcoxon_test(values[i], values[j])
+                summary["paired_tests"].append({
+                    "method_a": methods[i], "method_b": methods[j],
+                    "metric": metric, "k": int(k),
+                    "mean_diff": float((values[i] - values[j]).mean()),
+                    "permutation_pvalue": self.permutation_test(values[i], values[j]),
+                    "wilcoxon_statistic": statistic,
+                    "wilcoxon_pvalue": wilcoxon_p,
+                })
+        if output_path is not None:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=4)
+        return summary
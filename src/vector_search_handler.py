@@ -1,5 +1,11 @@
 from sklearn.metrics.pairwise import cosine_similarity, euclidean_distances
+from scipy.sparse import csr_matrix
+from numpy.lib.format import open_memmap
 import numpy as np
+import pandas as pd
+import os
+from src.gds_connector import get_gds_connection
+from src.id_handler import get_id_dictionary
 
 class VectorRetriever:
     """
@@ -13,15 +19,42 @@ class VectorRetriever:
                       **ps**: consine, euclidean and combined methods are applied in a brute-force
                               manner while 'ann' uses approximate nearest neighbors for faster search.
         - **length**: number of users to retrieve (default 100)
-    - output: 2D numpy array of item_id and ordered user_ids
+        - **user_filter**: optional segment of users to score: a filter expression
+                           resolved by segment_index (UserSegmentIndex), or an array
+                           of row indices / boolean mask of users_array. Only the
+                           matching rows are gathered and scored; a segment
+                           without users gives an empty recommendation.
+        - **segment_index**: UserSegmentIndex built on users_array[0]
+    - output: item_id and the ordered user indices (IdDictionary) as an int32 array
     """
-    def __init__(self, item_array, users_array, method='cosine', length=100):
+    def __init__(self, item_array, users_array, method='cosine', length=100,
+                 user_filter=None, segment_index=None):
         self.item_array = item_array
-        self.users_array = users_array
         self.method = method
+        if user_filter is not None:
+            users_array = self._filter_users(users_array, user_filter, segment_index)
+        self.users_array = users_array
         self.length = min(length, len(users_array[0]))
 
+    @staticmethod
+    def _filter_users(users_array, user_filter, segment_index):
+        if isinstance(user_filter, (str, dict)):
+            if segment_index is None:
+                raise ValueError("A filter expression requires a segment_index")
+            rows = segment_index.rows(user_filter)
+        else:
+            rows = np.asarray(user_filter)
+            if rows.dtype == bool:
+                rows = np.flatnonzero(rows)
+        return [np.asarray(users_array[0])[rows], users_array[1][rows]]
+
     def retrieve_users(self):
+        if len(self.users_array[0]) == 0:
+            # user_filter matched no user: nothing to score
+            return {
+                    "item_id": self.item_array[0],
+                    "recommended_users": np.array([], dtype=np.int32)
+                }
         if self.method == 'cosine':
             ordered_user_ids = self._cosine_similarity()
         elif self.method == 'euclidean':
@@ -49,7 +82,7 @@ class VectorRetriever:
                 self.item_array[1].reshape(1, -1)
                 ).flatten()
         top_indices = np.argsort(similarities)[::-1][:self.length]
-        return [self.users_array[0][i] for i in top_indices]
+        return np.asarray(self.users_array[0])[top_indices]
 
     def _euclidean_distances(self):
         distances = euclidean_distances(
@@ -57,7 +90,7 @@ class VectorRetriever:
             self.item_array[1].reshape(1, -1)
         ).flatten()
         top_indices = np.argsort(distances)[:self.length]
-        return [self.users_array[0][i] for i in top_indices]
+        return np.asarray(self.users_array[0])[top_indices]
 
     # def _combined(self):
     #     """
@@ -72,3 +105,278 @@ class VectorRetriever:
     #     Uses approximate nearest neighbors for faster search.
     #     Returns ordered user ids based on ANN search.
     #     """
+
+class ItemKNNRetriever:
+    """
+    Item-kNN retrieval for cold items: finds the nearest warm items of
+    each cold item in embedding space and scores users through the
+    watchers of those items, weighted by the similarity. Scores are a
+    sparse-dense product between the (cold x warm) neighbour weights and
+    a CSR item->users matrix built from the User_Movie csv file.
+    - inputs:
+        - **warm_items_array**: [movie indices, embeddings] of the warm items
+                                (UserEmbeddingHandler.create_user_and_item_vectors_arrays)
+        - **method**: 'cosine' or 'euclidean' (weight 1 / (1 + distance))
+        - **n_neighbors**: number of warm items per cold item
+        - **length**: number of users to retrieve
+    - output: list of dicts with item_id and ordered user indices, one per cold item
+    """
+    def __init__(self, warm_items_array, method='cosine', n_neighbors=20, length=100,
+                 path='data/watchedRel.csv'):
+        self.warm_items_array = warm_items_array
+        self.method = method
+        self.n_neighbors = min(n_neighbors, len(warm_items_array[0]))
+        self.item_users, self.user_ids = self.build_item_user_matrix(path)
+        self.length = min(length, len(self.user_ids))
+
+    def build_item_user_matrix(self, path):
+        """
+        CSR matrix with one row per warm item (same order as the
+        embedding index) and one column per user index.
+        """
+        ids = get_id_dictionary()
+        watched = pd.read_csv(path, dtype={'userId': 'int64', 'movieId': 'int64'})
+        cols = ids.encode_users(watched["userId"].to_numpy())
+        row_of_movie = np.full(ids.n_movies, -1, dtype=np.int64)
+        row_of_movie[self.warm_items_array[0]] = np.arange(len(self.warm_items_array[0]))
+        movies = ids.encode_movies(watched["movieId"].to_numpy())
+        rows = np.where(movies >= 0, row_of_movie[np.maximum(movies, 0)], -1)
+        known = (rows >= 0) & (cols >= 0)
+        matrix = csr_matrix(
+            (np.ones(known.sum(), dtype=np.float32), (rows[known], cols[known])),
+            shape=(len(self.warm_items_array[0]), ids.n_users))
+        return matrix, np.arange(ids.n_users, dtype=np.int32)
+
+    def retrieve_users(self, items_array):
+        """
+        Retrieves users for one or many cold items given as
+        [item id(s), vector(s)].
+        """
+        item_ids = np.atleast_1d(items_array[0])
+        vectors = np.atleast_2d(items_array[1])
+        weights = self._neighbor_weights(vectors)
+        scores = (weights @ self.item_users).toarray()
+        top = np.argpartition(-scores, self.length - 1, axis=1)[:, :self.length]
+        order = np.take_along_axis(-scores, top, axis=1).argsort(axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return [
+            {
+                "item_id": item_id,
+                "recommended_users": self.user_ids[row]
+            }
+            for item_id, row in zip(item_ids, top)
+        ]
+
+    def _neighbor_weights(self, vectors):
+        """
+        Sparse (n_cold x n_warm) matrix holding the similarity of
+        each cold item to its n_neighbors nearest warm items.
+        """
+        if self.method == 'cosine':
+            similarity = cosine_similarity(vectors, self.warm_items_array[1])
+        elif self.method == 'euclidean':
+            similarity = 1.0 / (1.0 + euclidean_distances(vectors, self.warm_items_array[1]))
+        else:
+            raise ValueError(f"Unsupported method: {self.method}")
+        neighbors = np.argpartition(-similarity, self.n_neighbors - 1, axis=1)[:, :self.n_neighbors]
+        values = np.take_along_axis(similarity, neighbors, axis=1).clip(min=0)
+        rows = np.repeat(np.arange(len(vectors)), self.n_neighbors)
+        return csr_matrix((values.ravel(), (rows, neighbors.ravel())),
+                          shape=(len(vectors), len(self.warm_items_array[0])))
+
+class Neo4jVectorRetriever:
+    """
+    Retrieval served by Neo4j: the User embeddings are written back as
+    node properties (UserEmbeddingHandler.write_user_embeddings) and the
+    top users of each cold item are read from a Neo4j 5 vector index
+    with db.index.vector.queryNodes, so the user matrix never leaves
+    the database. The index is approximate (HNSW), so rankings can
+    differ slightly from the brute-force VectorRetriever.
+    - inputs:
+        - **method**: 'cosine' or 'euclidean'
+        - **length**: number of users to retrieve
+        - **write_property**: User property holding the embeddings
+        - **batch_size**: number of items sent per query
+    - output: list of dicts with item_id and ordered user indices, one per cold item
+    """
+    def __init__(self, method='cosine', length=100, write_property='fastrpEmbedding',
+                 batch_size=256):
+        if method not in ('cosine', 'euclidean'):
+            raise ValueError(f"Unsupported method: {method}")
+        self.gds = get_gds_connection()
+        self.method = method
+        self.length = length
+        self.write_property = write_property
+        self.batch_size = batch_size
+        # Neo4j allows a single vector index per label and property,
+        # so each similarity function indexes its own copy of the embeddings
+        self.index_property = f"{write_property}_{method}"
+        self.index_name = f"user_{write_property}_{method}"
+
+    def create_index(self, dimension, timeout=300):
+        """
+        Copies the written embeddings to the indexed property, (re)creates
+        the vector index and waits until it is online.
+        """
+        self.gds.run_cypher(f"""
+        MATCH (u:User) WHERE u.{self.write_property} IS NOT NULL
+        CALL {{
+            WITH u
+            SET u.{self.index_property} = u.{self.write_property}
+        }} IN TRANSACTIONS OF 10000 ROWS
+        """)
+        self.gds.run_cypher(f"DROP INDEX {self.index_name} IF EXISTS")
+        self.gds.run_cypher(f"""
+        CREATE VECTOR INDEX {self.index_name}
+        FOR (u:User) ON (u.{self.index_property})
+        OPTIONS {{ indexConfig: {{
+            `vector.dimensions`: $dimension,
+            `vector.similarity_function`: $method
+        }} }}
+        """, params={"dimension": int(dimension), "method": self.method})
+        self.gds.run_cypher("CALL db.awaitIndex($name, $timeout)",
+                            params={"name": self.index_name, "timeout": timeout})
+
+    def retrieve_users(self, items_array):
+        """
+        Retrieves users for one or many cold items given as
+        [item id(s), vector(s)], batch_size items per round trip.
+        """
+        item_ids = np.atleast_1d(items_array[0])
+        vectors = np.atleast_2d(items_array[1]).astype(float)
+        ids = get_id_dictionary()
+        results = []
+        for start in range(0, len(item_ids), self.batch_size):
+            items = [
+                {"row": i, "vector": vector.tolist()}
+                for i, vector in enumerate(vectors[start:start + self.batch_size], start=start)
+            ]
+            result = self.gds.run_cypher("""
+            UNWIND $items AS item
+            CALL {
+                WITH item
+                CALL db.index.vector.queryNodes($indexName, $length, item.vector)
+                YIELD node, score
+                RETURN collect(node.userId) AS userIds
+            }
+            RETURN item.row AS row, userIds
+            """, params={"items": items, "indexName": self.index_name,
+                         "length": self.length})
+            for row, user_ids in zip(result["row"], result["userIds"]):
+                results.append({
+                    "item_id": item_ids[row],
+                    "recommended_users": ids.encode_users(np.array(user_ids))
+                })
+        return results
+
+class UserTopItemsRetriever:
+    """
+    Reverse batch mode: for every user, the top-k items among a batch
+    of new (cold) items. Users are streamed in blocks and items in
+    chunks; each user block keeps a running top-k that is merged with
+    every chunk. Scoring runs in float32 and the budget covers the
+    prepared item matrix as well as the block buffers, so peak memory
+    is bounded by memory_budget_mb. Results are written to disk block
+    by block; an empty item batch gives (n_users, 0) outputs.
+    - inputs:
+        - **items_array**: [item ids, embeddings] of the new items
+        - **users_array**: [user indices, embeddings]
+        - **method**: 'cosine' or 'euclidean'
+        - **length**: number of items per user (k)
+        - **memory_budget_mb**: budget for the item matrix and the score buffers
+        - **output_prefix**: files <prefix>_user_ids.npy, <prefix>_topk_items.npy
+                             and <prefix>_topk_scores.npy (memory-mapped)
+    """
+    def __init__(self, items_array, users_array, method='cosine', length=10,
+                 memory_budget_mb=256, output_prefix='experiments/user_topk_items'):
+        self.items_array = items_array
+        self.users_array = users_array
+        self.method = method
+        self.length = min(length, len(items_array[0]))
+        self.memory_budget = memory_budget_mb * 1024 ** 2
+        self.output_prefix = output_prefix
+
+    def _block_sizes(self, items):
+        """
+        Item chunk and user block sizes whose buffers (float32 scores of
+        a chunk plus running and candidate top-k values, int64 indices)
+        fit in the budget left by the prepared item matrix.
+        """
+        n_users = len(self.users_array[0])
+        dim = self.users_array[1].shape[1]
+        fixed_per_user = 32 * self.length + 8 * dim
+        available = self.memory_budget - items.nbytes - 4 * len(items)
+        if available < fixed_per_user + 24:
+            raise RuntimeError(
+                f"{len(items)} items ({items.nbytes / 1024 ** 2:.1f} MB) do not fit in a "
+                f"memory budget of {self.memory_budget / 1024 ** 2:.1f} MB; score smaller batches")
+        item_chunk = int(min(len(items), 4096, (available - fixed_per_user) // 24))
+        bytes_per_user = 24 * item_chunk + fixed_per_user
+        user_block = int(max(1, min(n_users, available // bytes_per_user)))
+        return user_block, item_chunk
+
+    def _prepare(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if self.method == 'cosine':
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            return matrix / norms
+        elif self.method == 'euclidean':
+            return matrix
+        raise ValueError(f"Unsupported method: {self.method}")
+
+    def _scores(self, users, items, items_sq):
+        """
+        Higher is better: cosine similarity or negative euclidean distance.
+        """
+        dot = users @ items.T
+        if self.method == 'cosine':
+            return dot
+        users_sq = np.einsum('ij,ij->i', users, users)[:, None]
+        return -np.sqrt(np.maximum(users_sq + items_sq[None, :] - 2 * dot, 0))
+
+    def retrieve_items(self):
+        """
+        Runs the blocked scoring and returns the paths of the output files.
+        """
+        item_ids = np.asarray(self.items_array[0])
+        user_ids = np.asarray(self.users_array[0])
+        n_users, k = len(user_ids), self.length
+
+        os.makedirs(os.path.dirname(self.output_prefix) or ".", exist_ok=True)
+        paths = {
+            "user_ids": f"{self.output_prefix}_user_ids.npy",
+            "topk_items": f"{self.output_prefix}_topk_items.npy",
+            "topk_scores": f"{self.output_prefix}_topk_scores.npy",
+        }
+        np.save(paths["user_ids"], user_ids)
+        out_items = open_memmap(paths["topk_items"], mode='w+',
+                                dtype=item_ids.dtype, shape=(n_users, k))
+        out_scores = open_memmap(paths["topk_scores"], mode='w+',
+                                 dtype=np.float32, shape=(n_users, k))
+        if len(item_ids) == 0:
+            return paths
+        items = self._prepare(np.asarray(self.items_array[1]).reshape(len(item_ids), -1))
+        items_sq = np.einsum('ij,ij->i', items, items)
+        user_block, item_chunk = self._block_sizes(items)
+
+        for start in range(0, n_users, user_block):
+            end = min(n_users, start + user_block)
+            users = self._prepare(self.users_array[1][start:end])
+            best_scores = np.full((end - start, k), -np.inf, dtype=np.float32)
+            best_items = np.zeros((end - start, k), dtype=np.int64)
+            for i_start in range(0, len(item_ids), item_chunk):
+                i_end = min(len(item_ids), i_start + item_chunk)
+                scores = self._scores(users, items[i_start:i_end], items_sq[i_start:i_end])
+                cand_scores = np.concatenate([best_scores, scores], axis=1)
+                cand_items = np.concatenate(
+                    [best_items, np.broadcast_to(np.arange(i_start, i_end), scores.shape)], axis=1)
+                top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(cand_scores, top, axis=1)
+                best_items = np.take_along_axis(cand_items, top, axis=1)
+            order = np.argsort(-best_scores, axis=1)
+            out_items[start:end] = item_ids[np.take_along_axis(best_items, order, axis=1)]
+            out_scores[start:end] = np.take_along_axis(best_scores, order, axis=1)
+            out_items.flush()
+            out_scores.flush()
+        return paths
@@ -0,0 +1,43 @@
+"""
+Neo4j 5 + GDS database of the integration tests: NEO4J_TEST_URI
+(NEO4J_TEST_USER and NEO4J_TEST_PASSWORD, e.g. a container started with
+`docker run -p 7687:7687 -e NEO4J_AUTH=neo4j/password
+-e NEO4J_PLUGINS='["graph-data-science"]' neo4j:5`) or, when the
+testcontainers package and Docker are available, a container started
+for the session. Tests using it are skipped when neither is reachable.
+"""
+import os
+import pytest
+
+def _connect(uri, user, password):
+    from graphdatascience import GraphDataScience
+    gds = GraphDataScience(uri, auth=(user, password))
+    gds.run_cypher("RETURN 1")
+    return gds
+
+@pytest.fixture(scope="session")
+def gds():
+    pytest.importorskip("graphdatascience")
+    uri = os.environ.get("NEO4J_TEST_URI")
+    if uri:
+        try:
+            client = _connect(uri, os.environ.get("NEO4J_TEST_USER", "neo4j"),
+                              os.environ.get("NEO4J_TEST_PASSWORD", "password"))
+        except Exception as e:
+            pytest.skip(f"Neo4j not reachable at {uri}: {e}")
+        yield client
+        client.close()
+        return
+    neo4j_container = pytest.importorskip("testcontainers.neo4j")
+    container = neo4j_container.Neo4jContainer("neo4j:5").with_env(
+        "NEO4J_PLUGINS", '["graph-data-science"]')
+    try:
+        container.start()
+    except Exception as e:
+        pytest.skip(f"Could not start a Neo4j container: {e}")
+    try:
+        client = _connect(container.get_connection_url(), container.username, container.password)
+        yield client
+        client.close()
+    finally:
+        container.stop()
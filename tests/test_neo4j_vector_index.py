@@ -0,0 +1,57 @@
+"""
+Neo4jVectorRetriever against a local Neo4j 5 + GDS database (see
+conftest.py): the top-k read from the vector index must match the
+brute-force VectorRetriever for cosine and euclidean. The test refuses
+to run on a database that already holds nodes.
+"""
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip("graphdatascience")
+from src import vector_search_handler
+from src.id_handler import IdDictionary
+from src.vector_search_handler import VectorRetriever, Neo4jVectorRetriever
+
+N_USERS = 200
+DIM = 16
+N_ITEMS = 20
+LENGTH = 10
+
+@pytest.fixture(scope="module")
+def users(gds):
+    if int(gds.run_cypher("MATCH (n) RETURN count(n) AS n")["n"].iloc[0]) > 0:
+        pytest.skip("The test database must be empty")
+    rng = np.random.default_rng(42)
+    user_ids = np.arange(1, N_USERS + 1)
+    vectors = rng.normal(size=(N_USERS, DIM))
+    gds.run_cypher("""
+    UNWIND $rows AS row
+    CREATE (:User { userId: row.userId, fastrpEmbedding: row.embedding })
+    """, params={"rows": [{"userId": str(u), "embedding": v.tolist()}
+                          for u, v in zip(user_ids, vectors)]})
+    yield user_ids, vectors
+    for method in ("cosine", "euclidean"):
+        gds.run_cypher(f"DROP INDEX user_fastrpEmbedding_{method} IF EXISTS")
+    gds.run_cypher("MATCH (u:User) DETACH DELETE u")
+
+@pytest.mark.parametrize("method", ["cosine", "euclidean"])
+def test_vector_index_matches_brute_force(gds, users, method, monkeypatch):
+    user_ids, vectors = users
+    ids = IdDictionary(user_ids, [], path=os.devnull)
+    monkeypatch.setattr(vector_search_handler, "get_gds_connection", lambda: gds)
+    monkeypatch.setattr(vector_search_handler, "get_id_dictionary", lambda: ids)
+
+    retriever = Neo4jVectorRetriever(method=method, length=LENGTH, batch_size=8)
+    retriever.create_index(DIM)
+    items = np.random.default_rng(7).normal(size=(N_ITEMS, DIM))
+    results = retriever.retrieve_users([np.arange(N_ITEMS), items])
+
+    users_array = [ids.encode_users(user_ids), vectors]
+    assert len(results) == N_ITEMS
+    for i, result in enumerate(results):
+        expected = VectorRetriever([np.array(i), items[i]], users_array,
+                                   method=method, length=LENGTH).retrieve_users()
+        assert result["item_id"] == i
+        # HNSW is approximate; on a graph this small it returns the exact top-k
+        assert result["recommended_users"].tolist() == expected["recommended_users"].tolist()
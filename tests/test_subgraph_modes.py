@@ -0,0 +1,80 @@
+"""
+--subgraph-mode cypher (NodeSubgraphHandler) and filtered
+(FilteredSubgraphHandler) must give the same subgraph for a held-out
+movie: its `hops` neighbourhood, not entered through the other held-out
+movies. Runs on the Neo4j 5 + GDS database of conftest.py and refuses
+to run on a database that already holds nodes.
+"""
+import pandas as pd
+import pytest
+
+pytest.importorskip("graphdatascience")
+from src import node_handler
+from src.node_handler import NodeHandler, NodeSubgraphHandler, FilteredSubgraphHandler
+
+HELD_OUT = [{"movieId": "1", "movieTitle": "One"}, {"movieId": "2", "movieTitle": "Two"}]
+ATTRIBUTES = pd.DataFrame(
+    [("1", "One", "Genre", "key", "LABELED", "drama"),
+     ("1", "One", "Release", "key", "RELEASED", "r1"),
+     ("2", "Two", "Genre", "key", "LABELED", "drama"),
+     ("2", "Two", "Genre", "key", "LABELED", "horror"),
+     ("2", "Two", "Release", "key", "RELEASED", "r2")],
+    columns=["movieId", "movieTitle", "nodeLabel", "attributeType", "relType", "attributeValue"])
+
+@pytest.fixture(scope="module")
+def graph(gds):
+    if int(gds.run_cypher("MATCH (n) RETURN count(n) AS n")["n"].iloc[0]) > 0:
+        pytest.skip("The test database must be empty")
+    # movie 2 is the only shortcut from movie 1 to horror and r2
+    gds.run_cypher("""
+    CREATE (drama:Genre {key: 'drama'}), (comedy:Genre {key: 'comedy'}),
+           (horror:Genre {key: 'horror'}),
+           (r1:Release {key: 'r1'}), (r2:Release {key: 'r2'}),
+           (a:Age {key: 'a1'}), (g:Gender {key: 'g1'}), (o:Occupation {key: 'o1'}),
+           (z1:Zipcode {key: 'z1'}), (z2:Zipcode {key: 'z2'}),
+           (m3:Movie {movieId: '3'})-[:LABELED]->(drama), (m3)-[:RELEASED]->(r1),
+           (m4:Movie {movieId: '4'})-[:LABELED]->(comedy), (m4)-[:RELEASED]->(r2),
+           (m5:Movie {movieId: '5'})-[:LABELED]->(horror), (m5)-[:RELEASED]->(r2)
+    WITH *
+    UNWIND [[1, m3, z1], [2, m4, z1], [3, m5, z2], [4, m4, z2]] AS row
+    WITH row, a, g, o, row[1] AS movie, row[2] AS zipcode
+    CREATE (u:User {userId: toString(row[0]), key: 'u' + toString(row[0])}),
+           (u)-[:WATCHED]->(movie), (u)-[:HAS_AGE]->(a), (u)-[:HAS_GENDER]->(g),
+           (u)-[:OCCUPATION]->(o), (u)-[:LIVES_IN]->(zipcode)
+    """)
+    yield
+    gds.run_cypher("MATCH (n) DETACH DELETE n")
+
+def _degrees(gds, projection):
+    result = gds.run_cypher("""
+    CALL gds.degree.stream($graph) YIELD nodeId, score
+    WITH gds.util.asNode(nodeId) AS n, score
+    RETURN coalesce(n.key, 'movie' + n.movieId) AS key, score
+    """, params={"graph": projection.name()})
+    return dict(zip(result["key"], result["score"]))
+
+@pytest.mark.parametrize("hops", [1, 2, 3])
+def test_filtered_subgraph_matches_cypher_subgraph(gds, graph, hops, monkeypatch):
+    monkeypatch.setattr(node_handler, "get_gds_connection", lambda: gds)
+    handler = NodeHandler()
+
+    cypher = {}
+    for movie in HELD_OUT:
+        handler.recreate_movie_nodes(movie)
+        handler.recreate_movie_attribute_rels(ATTRIBUTES[ATTRIBUTES["movieId"] == movie["movieId"]])
+        projection = NodeSubgraphHandler(movie["movieId"], hops).create_node_subgraph_projection()
+        cypher[movie["movieId"]] = _degrees(gds, projection)
+        gds.graph.drop(projection.name(), False)
+        handler.delete_nodes_and_rels(movie["movieId"])
+
+    filtered = {}
+    with FilteredSubgraphHandler(handler, HELD_OUT, ATTRIBUTES, hops, batch_size=1) as subgraphs:
+        for movie in HELD_OUT:
+            with subgraphs.item_subgraph_projection(movie["movieId"]) as projection:
+                filtered[movie["movieId"]] = _degrees(gds, projection)
+
+    # node set and number of relationships of every node
+    assert filtered == cypher
+    if hops == 2:
+        assert set(cypher["1"]) == {"movie1", "drama", "r1", "movie3"}
+    assert gds.run_cypher("MATCH (m:Movie) WHERE m.movieId IN ['1', '2'] RETURN count(m) AS n")["n"].iloc[0] == 0